@@ -6,167 +6,1380 @@ Converts PDF pages or existing PPTX slides to PowerPoint with AI-generated prese
 import os
 import sys
 import io
-import uuid
-import base64
+import json
+import time
+import random
+import hashlib
+import sqlite3
+import threading
+import multiprocessing
+import argparse
+import zipfile
+import functools
+import contextlib
+import copy
+from collections import OrderedDict, deque
+from types import MappingProxyType
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
 from pathlib import Path
 from pptx import Presentation
 from pptx.util import Inches
+from pptx.enum.shapes import MSO_SHAPE_TYPE
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.oxml.ns import qn
 import fitz  # PyMuPDF
 from PIL import Image
 from google import genai
 from google.genai import types
+from google.genai import errors
 from dotenv import load_dotenv
 
+# SIMD base64 for the preview images streamed to the web UI, when installed
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
+
 # Load environment variables
 load_dotenv()
 
+# Gemini model, resolved once (after .env is loaded); it is part of every notes cache key
+_MODEL_NAME = os.environ.get('GEMINI_MODEL', 'gemini-3-flash-preview')
+
+# Maximum number of Gemini requests in flight at once (size to your tier's RPM)
+DEFAULT_CONCURRENCY = int(os.environ.get("GEMINI_CONCURRENCY", "10"))
+
+# Slides with less text than this (and no pictures) are not worth a Gemini call
+MIN_SLIDE_TEXT_CHARS = 10
+
+EMPTY_SLIDE_NOTES = ("This slide appears to be empty or contains only visual elements without text. "
+                     "Please review and add custom speaker notes as needed.")
+
+# Slides sent to Gemini per request when notes are generated in batches (1 disables batching)
+GEMINI_BATCH_SIZE = int(os.environ.get("GEMINI_BATCH_SIZE", "5"))
+
+# Input token budget for text prompts; longer slide text is truncated before sending
+GEMINI_MAX_INPUT_TOKENS = int(os.environ.get("GEMINI_MAX_INPUT_TOKENS", "30000"))
+
+# Placeholder used when Gemini fails for a slide; never checkpointed, so re-runs retry it
+FAILED_NOTES = "Speaker notes could not be generated for this slide."
+
+# Save a partial PPTX after this many PDF pages have their notes
+CHECKPOINT_EVERY = int(os.environ.get("CHECKPOINT_EVERY", "25"))
+
+# JPEG quality for rendered slide images (embedded in the PPTX and sent to Gemini)
+JPEG_QUALITY = 85
+
+# Default PDF render resolution; 150 DPI is sharp on screen at a fraction of 200-300 DPI cost
+DEFAULT_DPI = 150
+
+# Longest edge (px) of a rendered PDF page; poster-sized pages are rendered at
+# a lower effective DPI instead of producing enormous slide images
+RENDER_MAX_PX = int(os.environ.get("RENDER_MAX_PX", "3000"))
+
+# Pages allowed between "rendered" and "notes attached"; caps memory on long PDFs
+DEFAULT_CHUNK_SIZE = int(os.environ.get("SLIDE_CHUNK", "20"))
+
+# Worker processes used to rasterize PDF pages in parallel
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", str(os.cpu_count() or 1)))
+
+# Pages each render worker (or the render thread) may finish ahead of the consumer
+RENDER_READ_AHEAD = int(os.environ.get("RENDER_READ_AHEAD", "2"))
+
+# Threads used to decode and resize the pictures of one PPTX slide (Pillow releases the GIL)
+PICTURE_DECODE_WORKERS = int(os.environ.get("PICTURE_DECODE_WORKERS", "4"))
+
+# Fonts tried, in order, for text drawn on PPTX slide renders (see _get_font)
+_FONT_CANDIDATES = ("arial.ttf", "Arial.ttf", "DejaVuSans.ttf", "LiberationSans-Regular.ttf")
+
+# Longest edge (px) of images sent to Gemini; larger images only cost more upload time and tokens
+GEMINI_MAX_PX = int(os.environ.get("GEMINI_MAX_PX", "1024"))
+
+# Longest edge (px) and JPEG quality of the slide previews streamed to the web UI
+PREVIEW_MAX_PX = int(os.environ.get("PREVIEW_MAX_PX", "640"))
+PREVIEW_JPEG_QUALITY = 70
+# Resampling filter for preview thumbnails ("bilinear", "bicubic", "lanczos"...)
+PREVIEW_RESAMPLE = Image.Resampling[os.environ.get("PREVIEW_RESAMPLE", "bilinear").upper()]
+
+# Retry policy for transient Gemini failures (rate limits, overload, timeouts)
+GEMINI_MAX_ATTEMPTS = int(os.environ.get("GEMINI_MAX_ATTEMPTS", "5"))
+GEMINI_BACKOFF_INITIAL = 0.5
+GEMINI_BACKOFF_MAX = 16.0
+
+# Receive Gemini responses as a stream of chunks (set GEMINI_STREAM=0 for single responses)
+GEMINI_STREAM = os.environ.get("GEMINI_STREAM", "1") != "0"
+
+# Seconds a rate-limited API key is skipped before being tried again
+KEY_COOLDOWN_SECONDS = 60
+
+# Requests per minute allowed on each API key (0 disables pacing); see GeminiClientPool
+GEMINI_RPM = int(os.environ.get("GEMINI_RPM", "300"))
+
+# Gemini requests in flight across every job in this process (the server runs
+# several uploads at once, each with its own GEMINI_CONCURRENCY workers)
+GEMINI_MAX_IN_FLIGHT = int(os.environ.get("GEMINI_MAX_IN_FLIGHT", "32"))
+_gemini_in_flight = threading.BoundedSemaphore(max(1, GEMINI_MAX_IN_FLIGHT))
+
+_RATE_LIMIT_MESSAGES = ("rate limit", "quota", "429", "resource_exhausted")
+_RETRYABLE_MESSAGES = _RATE_LIMIT_MESSAGES + ("unavailable", "overloaded", "deadline", "timed out")
+
+# Exceptions that indicate a bug rather than an API failure
+_PROGRAMMING_ERRORS = (TypeError, NameError, AttributeError)
+
+
+def load_api_keys(api_key=None):
+    """
+    Collect the Gemini API keys to rotate across.
+    
+    Args:
+        api_key (str): Explicit key; GOOGLE_API_KEY is used when omitted
+    
+    Returns:
+        list: Unique API keys, including any listed in GOOGLE_API_KEYS (JSON list)
+    """
+    keys = [api_key or os.environ.get('GOOGLE_API_KEY')]
+    
+    extra_keys = os.environ.get('GOOGLE_API_KEYS')
+    if extra_keys:
+        try:
+            keys.extend(json.loads(extra_keys))
+        except ValueError:
+            print("Warning: GOOGLE_API_KEYS is not a valid JSON list, ignoring it")
+    
+    return list(dict.fromkeys(key for key in keys if key))
+
+
+# genai.Client per API key, shared by every job in this process (e.g. all server requests)
+_CLIENT_CACHE = {}
+_client_cache_lock = threading.Lock()
+
+
+# Ask for compressed responses explicitly rather than relying on the HTTP
+# library's defaults. Requests are not compressed: the bulk of each one is
+# an already-compressed JPEG.
+_HTTP_OPTIONS = types.HttpOptions(headers={"Accept-Encoding": "gzip"})
+
+
+def _get_client(api_key):
+    """
+    Return the process-wide Gemini client for an API key, creating it on first use.
+    
+    Reusing the client keeps its HTTP connection pool (and TLS sessions) warm
+    across jobs instead of paying client setup and handshakes per upload.
+    
+    Args:
+        api_key (str): Google AI API key
+    
+    Returns:
+        genai.Client
+    """
+    with _client_cache_lock:
+        client = _CLIENT_CACHE.get(api_key)
+        if client is None:
+            client = _CLIENT_CACHE[api_key] = genai.Client(api_key=api_key, http_options=_HTTP_OPTIONS)
+        return client
+
+
+class GeminiClientPool:
+    """
+    Round-robin pool of Gemini clients, one per API key.
+    
+    Each key has its own rate limit, so spreading requests over N keys raises
+    the effective RPM ceiling roughly N times. A key that gets rate-limited is
+    skipped for KEY_COOLDOWN_SECONDS.
+    
+    Every key is also paced by a token bucket refilled at `rpm` requests per
+    minute, so a burst of concurrent slides waits its turn instead of running
+    into 429s. The bucket holds up to ten seconds' worth of requests.
+    """
+    
+    def __init__(self, api_keys, cooldown=KEY_COOLDOWN_SECONDS, rpm=GEMINI_RPM):
+        if not api_keys:
+            raise ValueError("Google API key required. Set GOOGLE_API_KEY in .env file.")
+        self._clients = [_get_client(key) for key in api_keys]
+        self._cooldown_until = [0.0] * len(self._clients)
+        self._next = 0
+        self._lock = threading.Lock()
+        self.cooldown = cooldown
+        
+        self.rpm = rpm
+        self._burst = max(1, rpm // 6)
+        self._tokens = [float(self._burst)] * len(self._clients)
+        self._refilled_at = [time.time()] * len(self._clients)
+    
+    def __len__(self):
+        return len(self._clients)
+    
+    def acquire(self):
+        """
+        Pick the next client whose key is not cooling down, waiting for its rate budget.
+        
+        Returns:
+            tuple: (key index, genai.Client); if every key is cooling down,
+            the one that recovers soonest
+        """
+        with self._lock:
+            now = time.time()
+            count = len(self._clients)
+            index = min(range(count), key=self._cooldown_until.__getitem__)
+            for offset in range(count):
+                candidate = (self._next + offset) % count
+                if self._cooldown_until[candidate] <= now:
+                    index = candidate
+                    break
+            self._next = (index + 1) % count
+            delay = self._reserve(index, now)
+        
+        # Sleep outside the lock so other threads can reserve on other keys
+        if delay > 0:
+            time.sleep(delay)
+        return index, self._clients[index]
+    
+    def _reserve(self, index, now):
+        """
+        Take a token from a key's bucket; the caller must hold the lock.
+        
+        Returns:
+            float: Seconds to wait before the reserved request may start
+        """
+        if self.rpm <= 0:
+            return 0.0
+        rate = self.rpm / 60.0
+        self._tokens[index] = min(self._burst, self._tokens[index] + (now - self._refilled_at[index]) * rate)
+        self._refilled_at[index] = now
+        self._tokens[index] -= 1
+        return 0.0 if self._tokens[index] >= 0 else -self._tokens[index] / rate
+    
+    def mark_rate_limited(self, index):
+        """Bench a key after it was rate-limited."""
+        with self._lock:
+            self._cooldown_until[index] = time.time() + self.cooldown
+    
+    def has_available(self):
+        """Return True if at least one key is not cooling down."""
+        with self._lock:
+            now = time.time()
+            return any(until <= now for until in self._cooldown_until)
+
+
+def _is_rate_limit_error(error):
+    """Return True if a Gemini error means the API key hit its rate limit."""
+    if isinstance(error, errors.APIError) and getattr(error, 'code', None) == 429:
+        return True
+    
+    message = str(error).lower()
+    return any(marker in message for marker in _RATE_LIMIT_MESSAGES)
+
+
+def _is_retryable_error(error):
+    """
+    Decide whether a Gemini error is transient and worth retrying.
+    
+    Args:
+        error (Exception): Exception raised by the Gemini client
+    
+    Returns:
+        bool: True for rate-limit, 5xx and timeout errors
+    """
+    if isinstance(error, errors.APIError):
+        code = getattr(error, 'code', None)
+        if code == 429 or (code is not None and code >= 500):
+            return True
+    
+    message = str(error).lower()
+    return any(marker in message for marker in _RETRYABLE_MESSAGES)
+
+
+def _generate_content_with_retry(client_pool, model, contents, max_attempts=GEMINI_MAX_ATTEMPTS, config=None):
+    """
+    Call Gemini, retrying transient failures with jittered exponential backoff.
+    
+    A rate-limited key is benched and the retry goes straight to the next
+    key in the pool; backoff only applies once no other key is available.
+    With GEMINI_STREAM the response is consumed chunk by chunk as the model
+    writes it; a stream that breaks off is retried as a whole. At most
+    GEMINI_MAX_IN_FLIGHT calls run at once across the whole process.
+    
+    Args:
+        client_pool (GeminiClientPool): Clients to rotate across
+        model (str): Gemini model name
+        contents (list): Request parts
+        max_attempts (int): Total attempts before giving up
+        config (types.GenerateContentConfig): Optional request config
+    
+    Returns:
+        str: Response text (empty if Gemini returned none)
+    """
+    max_attempts = max(max_attempts, len(client_pool) + 1)
+    backoff_step = 0
+    for attempt in range(max_attempts):
+        key_index, client = client_pool.acquire()
+        try:
+            with _gemini_in_flight:
+                if GEMINI_STREAM:
+                    chunks = client.models.generate_content_stream(model=model, contents=contents, config=config)
+                    return "".join(chunk.text or "" for chunk in chunks)
+                return client.models.generate_content(model=model, contents=contents, config=config).text or ""
+        except Exception as e:
+            if attempt == max_attempts - 1 or not _is_retryable_error(e):
+                raise
+            if _is_rate_limit_error(e):
+                client_pool.mark_rate_limited(key_index)
+                if client_pool.has_available():
+                    print(f"    API key {key_index + 1} rate-limited, switching keys...")
+                    continue
+            delay = min(GEMINI_BACKOFF_MAX, GEMINI_BACKOFF_INITIAL * 2 ** backoff_step)
+            backoff_step += 1
+            delay += random.uniform(0, GEMINI_BACKOFF_INITIAL)
+            print(f"    Gemini request failed ({str(e)[:80]}), retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+
+# Persistent cache of generated notes, keyed by model + prompt + slide content
+NOTES_CACHE_DB = os.environ.get("NOTES_CACHE_DB", ".notes_cache.sqlite")
+# Cached notes older than this are regenerated (0 keeps them forever)
+NOTES_CACHE_TTL_SECONDS = float(os.environ.get("NOTES_CACHE_TTL_DAYS", "7")) * 86400
+# Also reuse notes of re-exported PPTX slides: same text (up to whitespace), near-identical render
+NOTES_NEAR_DUPLICATE_CACHE = os.environ.get("NOTES_NEAR_DUPLICATE_CACHE", "0") == "1"
+# Max differing bits (of 256) between the renders of two slides counted as re-exports
+NOTES_NEAR_DUPLICATE_MAX_DISTANCE = 4
+_cache_enabled = os.environ.get("NOTES_CACHE", "1") != "0"
+_cache_conn = None
+_cache_lock = threading.Lock()
+
+
+# On-disk cache of rendered PPTX slides, see render_slide_with_text()
+RENDER_CACHE_DIR = os.environ.get("RENDER_CACHE_DIR", ".slide_render_cache")
+_render_cache_enabled = os.environ.get("RENDER_CACHE", "1") == "1"
+# Renders unused for this long are deleted (0 keeps them forever)
+RENDER_CACHE_TTL_SECONDS = float(os.environ.get("RENDER_CACHE_TTL_DAYS", "7")) * 86400
+# Beyond this total size the least recently used renders are deleted (0 = no cap)
+RENDER_CACHE_MAX_BYTES = int(os.environ.get("RENDER_CACHE_MAX_MB", "500")) * 1024 * 1024
+# Bump when the slide drawing code changes so stale renders are not reused
+_RENDER_VERSION = 4
+
+
+def disable_render_cache():
+    """Turn off the slide render cache for this process (e.g. for --no-cache)."""
+    global _render_cache_enabled
+    _render_cache_enabled = False
+
+
+def disable_notes_cache():
+    """Turn off the notes cache for this process (e.g. for --no-cache)."""
+    global _cache_enabled
+    _cache_enabled = False
+
+
+def _notes_cache_key(model_name, prompt, payload):
+    """
+    Build a deterministic cache key for a Gemini request.
+    
+    Args:
+        model_name (str): Gemini model name
+        prompt (str): Full prompt text
+        payload (bytes): Image bytes or encoded slide text
+    
+    Returns:
+        str: SHA-256 hex digest
+    """
+    return hashlib.sha256(
+        model_name.encode() + b"|" + prompt.encode() + b"|" + payload
+    ).hexdigest()
+
+
+def _get_cache_conn():
+    """Open the SQLite cache on first use. Caller must hold _cache_lock."""
+    global _cache_conn
+    if _cache_conn is None:
+        _cache_conn = sqlite3.connect(NOTES_CACHE_DB, check_same_thread=False, timeout=30)
+        # WAL lets the CLI and server share the file without "database is locked"
+        # errors, and NORMAL sync avoids an fsync for every cached slide
+        _cache_conn.execute("PRAGMA journal_mode=WAL")
+        _cache_conn.execute("PRAGMA synchronous=NORMAL")
+        _cache_conn.execute("CREATE TABLE IF NOT EXISTS notes(key TEXT PRIMARY KEY, notes TEXT, created REAL)")
+        _cache_conn.execute(
+            "CREATE TABLE IF NOT EXISTS near_notes"
+            "(key TEXT PRIMARY KEY, slide_text TEXT, image_hash TEXT, notes TEXT, created REAL)"
+        )
+        _cache_conn.execute("DELETE FROM notes WHERE created < ?", (_cache_cutoff(),))
+        _cache_conn.execute("DELETE FROM near_notes WHERE created < ?", (_cache_cutoff(),))
+        _cache_conn.commit()
+    return _cache_conn
+
+
+def _cache_cutoff():
+    """Return the creation time before which cache entries count as expired."""
+    if NOTES_CACHE_TTL_SECONDS <= 0:
+        return 0.0
+    return time.time() - NOTES_CACHE_TTL_SECONDS
+
+
+def _cache_get(key):
+    """Return cached notes for key, or None on a miss or when caching is off."""
+    if not _cache_enabled:
+        return None
+    try:
+        with _cache_lock:
+            row = _get_cache_conn().execute(
+                "SELECT notes FROM notes WHERE key=? AND created >= ?", (key, _cache_cutoff())
+            ).fetchone()
+        return row[0] if row else None
+    except sqlite3.Error as e:
+        print(f"    Warning: Notes cache lookup failed: {e}")
+        return None
+
+
+def _cache_put(key, notes):
+    """Store generated notes under key (no-op when caching is off)."""
+    if not _cache_enabled:
+        return
+    try:
+        with _cache_lock:
+            conn = _get_cache_conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO notes(key, notes, created) VALUES (?, ?, ?)", (key, notes, time.time())
+            )
+            conn.commit()
+    except sqlite3.Error as e:
+        print(f"    Warning: Notes cache write failed: {e}")
+
+
+def _image_dhash(image, hash_size=16):
+    """
+    Compute a difference hash of a slide image (256 bits by default).
+    
+    Re-exported slides with tiny pixel differences (anti-aliasing, picture
+    recompression) produce hashes only a few bits apart.
+    
+    Args:
+        image: PIL Image
+        hash_size (int): Hash grid size (hash has hash_size**2 bits)
+    
+    Returns:
+        int: Perceptual hash
+    """
+    small = image.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = list(small.getdata())
+    
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+
+def _near_duplicate_entry(slide_text, slide_image, note_style="standard", note_tone="professional"):
+    """
+    Describe a PPTX slide for the near-duplicate notes cache.
+    
+    The key is an exact digest of the slide's text with whitespace collapsed,
+    so only slides saying the same words can match; the render's perceptual
+    hash is then checked on lookup, so a slide whose pictures changed does
+    not match either.
+    
+    Args:
+        slide_text (str): Text extracted from the slide's shapes
+        slide_image: PIL Image of the slide, or None for text-only slides
+        note_style: Style of notes - 'brief', 'standard', or 'detailed'
+        note_tone: Tone of notes - 'professional', 'casual', 'academic', or 'persuasive'
+    
+    Returns:
+        tuple: (key, normalized text, image hash or None), or None when the
+        tier is off or the slide has too little text to verify a match
+    """
+    if not (NOTES_NEAR_DUPLICATE_CACHE and _cache_enabled):
+        return None
+    text = " ".join(slide_text.split())
+    if len(text) < MIN_SLIDE_TEXT_CHARS:
+        return None
+    
+    if slide_image is not None:
+        prompt = _image_notes_prompt(note_style, note_tone)
+        image_hash = _image_dhash(slide_image)
+    else:
+        prompt = "".join(_text_prompt_parts(note_style, note_tone))
+        image_hash = None
+    return _notes_cache_key(_MODEL_NAME, prompt, text.encode("utf-8")), text, image_hash
+
+
+def _near_duplicate_get(entry):
+    """
+    Return notes cached for a re-export of the slide described by entry, or None.
+    
+    Args:
+        entry (tuple): See _near_duplicate_entry()
+    """
+    if entry is None:
+        return None
+    key, text, image_hash = entry
+    try:
+        with _cache_lock:
+            row = _get_cache_conn().execute(
+                "SELECT slide_text, image_hash, notes FROM near_notes WHERE key=? AND created >= ?",
+                (key, _cache_cutoff())
+            ).fetchone()
+    except sqlite3.Error as e:
+        print(f"    Warning: Notes cache lookup failed: {e}")
+        return None
+    
+    # Verify the match rather than trusting the digest alone
+    if row is None or row[0] != text:
+        return None
+    stored_hash = row[1]
+    if image_hash is None or stored_hash is None:
+        return row[2] if image_hash is None and stored_hash is None else None
+    distance = bin(int(stored_hash, 16) ^ image_hash).count("1")
+    return row[2] if distance <= NOTES_NEAR_DUPLICATE_MAX_DISTANCE else None
+
+
+def _near_duplicate_put(entry, notes):
+    """Remember notes for the slide described by entry (no-op for None or failed notes)."""
+    if entry is None or notes in (FAILED_NOTES, EMPTY_SLIDE_NOTES):
+        return
+    key, text, image_hash = entry
+    try:
+        with _cache_lock:
+            conn = _get_cache_conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO near_notes(key, slide_text, image_hash, notes, created) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, text, None if image_hash is None else f"{image_hash:x}", notes, time.time())
+            )
+            conn.commit()
+    except sqlite3.Error as e:
+        print(f"    Warning: Notes cache write failed: {e}")
+
+
+def dpi_matrix(dpi):
+    """Return the PyMuPDF zoom matrix for rendering at the given DPI."""
+    zoom = dpi / 72
+    return fitz.Matrix(zoom, zoom)
+
+
+def render_page(doc, page_num, zoom_matrix):
+    """
+    Render a page of an already-open PDF as an image.
+    
+    Args:
+        doc (fitz.Document): Open PDF document
+        page_num (int): Page number (0-indexed)
+        zoom_matrix (fitz.Matrix): Render matrix, see dpi_matrix()
+    
+    Returns:
+        PIL Image
+    """
+    pix = doc[page_num].get_pixmap(matrix=zoom_matrix, colorspace=fitz.csRGB, alpha=False)
+    
+    # Wrap the pixmap's buffer without the intermediate bytes copy pix.samples
+    # makes; copy() once so the image outlives the pixmap's memory
+    return Image.frombuffer("RGB", (pix.width, pix.height), pix.samples_mv, "raw", "RGB", pix.stride, 1).copy()
+
+
+def _shrink_pixmap(pix, max_px):
+    """
+    Scale a pixmap down so its longest edge is at most max_px.
+    
+    Args:
+        pix (fitz.Pixmap): Source pixmap
+        max_px (int): Longest edge allowed
+    
+    Returns:
+        fitz.Pixmap: pix itself if it already fits, else a scaled copy
+    """
+    longest_edge = max(pix.width, pix.height)
+    if longest_edge <= max_px:
+        return pix
+    scale = max_px / longest_edge
+    # The explicit clip=None matters: PyMuPDF 1.23's three-argument form
+    # raises "bad clip parameter"
+    return fitz.Pixmap(pix, max(1, int(pix.width * scale)), max(1, int(pix.height * scale)), None)
+
+
+def render_page_bytes(doc, page_num, zoom_matrix, lossless=False, gemini_max_px=GEMINI_MAX_PX,
+                      preview_max_px=None):
+    """
+    Render a page of an already-open PDF straight to encoded image bytes.
+    
+    PyMuPDF encodes the pixmap itself, so no PIL image is built. The page is
+    rendered once at display resolution; Gemini gets a downscaled JPEG copy
+    (or the very same bytes when the render is already small enough), and
+    the web UI's thumbnail is scaled from that same pixmap.
+    
+    Args:
+        doc (fitz.Document): Open PDF document
+        page_num (int): Page number (0-indexed)
+        zoom_matrix (fitz.Matrix): Render matrix, see dpi_matrix()
+        lossless (bool): Encode the slide image as PNG instead of JPEG
+        gemini_max_px (int): Longest edge of the image sent to Gemini
+        preview_max_px (int): If set, also encode a JPEG thumbnail this size
+    
+    Returns:
+        tuple: (image_bytes, width, height, mime_type, gemini_jpeg_bytes,
+        preview_jpeg_bytes or None)
+    """
+    page = doc[page_num]
+    longest_edge = max(page.rect.width, page.rect.height) * zoom_matrix.a
+    if RENDER_MAX_PX > 0 and longest_edge > RENDER_MAX_PX:
+        zoom_matrix = zoom_matrix * (RENDER_MAX_PX / longest_edge)
+    
+    # Opaque 3-channel RGB: what JPEG needs, and no alpha bytes to render or drop
+    pix = page.get_pixmap(matrix=zoom_matrix, colorspace=fitz.csRGB, alpha=False)
+    
+    if lossless:
+        image_bytes, mime_type = pix.tobytes("png"), 'image/png'
+    else:
+        image_bytes, mime_type = pix.tobytes("jpeg", jpg_quality=JPEG_QUALITY), 'image/jpeg'
+    
+    small_pix = _shrink_pixmap(pix, gemini_max_px)
+    if small_pix is not pix:
+        gemini_bytes = small_pix.tobytes("jpeg", jpg_quality=JPEG_QUALITY)
+    elif lossless:
+        gemini_bytes = pix.tobytes("jpeg", jpg_quality=JPEG_QUALITY)
+    else:
+        gemini_bytes = image_bytes
+    
+    preview_bytes = None
+    if preview_max_px:
+        thumb_pix = _shrink_pixmap(small_pix, preview_max_px)
+        if thumb_pix is not small_pix:
+            preview_bytes = thumb_pix.tobytes("jpeg", jpg_quality=PREVIEW_JPEG_QUALITY)
+        else:
+            preview_bytes = gemini_bytes
+    
+    return image_bytes, pix.width, pix.height, mime_type, gemini_bytes, preview_bytes
+
+
+# Document opened by this render worker process, see _init_render_worker()
+_worker_doc = None
+_worker_matrix = None
+
+
+def _init_render_worker(pdf_path, dpi):
+    """
+    Open the PDF once when a render worker process starts.
+    
+    fitz.Document handles cannot be shared across processes, so each worker
+    parses the PDF itself, as soon as it is spawned and before any page is
+    queued, then keeps the handle for every page it renders.
+    """
+    global _worker_doc, _worker_matrix
+    _worker_doc = fitz.open(pdf_path)
+    _worker_matrix = dpi_matrix(dpi)
+
+
+def _render_page_worker(page_num, lossless, preview_max_px=None):
+    """Render one page in a worker process (see iter_pdf_pages)."""
+    return render_page_bytes(_worker_doc, page_num, _worker_matrix, lossless, preview_max_px=preview_max_px)
+
+
+def iter_pdf_pages(doc, dpi=DEFAULT_DPI, lossless=False, max_workers=RENDER_WORKERS, preview_max_px=None):
+    """
+    Lazily render the pages of a PDF, in parallel worker processes when worthwhile.
+    
+    Rasterizing is CPU-bound and independent per page, so pages are spread
+    over a process pool. Only RENDER_READ_AHEAD pages per worker are
+    rendered ahead of the consumer, so memory stays flat however long the
+    PDF is.
+    Small PDFs (or max_workers=1) are rendered by one background thread,
+    which still works ahead while the consumer waits on Gemini.
+    
+    Args:
+        doc (fitz.Document): Open PDF document (used directly for small PDFs)
+        dpi (int): Resolution
+        lossless (bool): Encode slide images as PNG instead of JPEG
+        max_workers (int): Maximum number of render processes
+        preview_max_px (int): If set, also produce web UI thumbnails
+    
+    Yields:
+        render_page_bytes() tuples in page order
+    """
+    num_pages = len(doc)
+    
+    if max_workers <= 1 or num_pages < 4:
+        # A single thread owns the document (MuPDF handles are not thread-safe)
+        zoom_matrix = dpi_matrix(dpi)
+        executor = ThreadPoolExecutor(max_workers=1)
+        render = functools.partial(render_page_bytes, doc, zoom_matrix=zoom_matrix, lossless=lossless,
+                                   preview_max_px=preview_max_px)
+        workers = 1
+    else:
+        workers = min(max_workers, num_pages)
+        # Spawn, not fork: the server forks from a process full of threads (uvicorn, Gemini
+        # workers, other jobs) that may hold locks; workers reopen the PDF by path anyway
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=_init_render_worker, initargs=(doc.name, dpi))
+        render = functools.partial(_render_page_worker, lossless=lossless, preview_max_px=preview_max_px)
+    
+    read_ahead = max(1, RENDER_READ_AHEAD) * workers
+    with executor:
+        pending = deque()
+        next_page = 0
+        try:
+            while next_page < num_pages or pending:
+                while next_page < num_pages and len(pending) < read_ahead:
+                    pending.append(executor.submit(render, next_page))
+                    next_page += 1
+                yield pending.popleft().result()
+        finally:
+            # If the consumer stopped early, don't render pages nobody will use
+            for future in pending:
+                future.cancel()
+
+
+def encode_image(image, lossless=False, max_px=None):
+    """
+    Encode a PIL image for upload to Gemini or embedding in a slide.
+    
+    Args:
+        image: PIL Image
+        lossless (bool): Encode as PNG instead of JPEG
+        max_px (int): If set, downscale so the longest edge is at most this
+    
+    Returns:
+        tuple: (image_bytes, mime_type)
+    """
+    if max_px:
+        image = _fit_within(image, max_px, Image.LANCZOS)
+    
+    buffer = io.BytesIO()
+    if lossless:
+        image.save(buffer, format='PNG')
+        return buffer.getvalue(), 'image/png'
+    
+    # convert() always copies, so only call it for modes JPEG can't store
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    image.save(buffer, format='JPEG', quality=JPEG_QUALITY, optimize=False)
+    return buffer.getvalue(), 'image/jpeg'
+
+
+def _fit_within(image, max_px, resample):
+    """
+    Downscale a PIL image so its longest edge is at most max_px.
+    
+    Returns:
+        PIL Image: A resized copy, or the image itself if it already fits
+    """
+    longest_edge = max(image.size)
+    if longest_edge <= max_px:
+        return image
+    scale = max_px / longest_edge
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, resample, reducing_gap=2.0)
+
+
+def _preview_base64(image, encoded_jpeg=None):
+    """
+    Build the base64 JPEG thumbnail shown in the web UI for a slide image.
+    
+    Takes the in-memory image (e.g. the Gemini-sized render) so the preview
+    never has to decode a JPEG that was just encoded.
+    
+    Args:
+        image: PIL Image of the slide
+        encoded_jpeg (bytes): JPEG already encoded from image, reused as the
+            preview when no downscaling is needed
+    
+    Returns:
+        str: Base64 JPEG, at most PREVIEW_MAX_PX on its longest edge
+    """
+    preview_image = _fit_within(image, PREVIEW_MAX_PX, PREVIEW_RESAMPLE)
+    if preview_image is image and encoded_jpeg is not None:
+        return base64.b64encode(encoded_jpeg).decode('ascii')
+    
+    if preview_image.mode not in ('RGB', 'L'):
+        preview_image = preview_image.convert('RGB')
+    with io.BytesIO() as buffer:
+        preview_image.save(buffer, format='JPEG', quality=PREVIEW_JPEG_QUALITY)
+        # Encode from the buffer's memory directly; getvalue() would copy it first
+        return base64.b64encode(buffer.getbuffer()).decode('ascii')
+
+
+def _open_pdf(pdf):
+    """
+    Open a PDF path, or pass an already-open document through unclosed.
+    
+    Args:
+        pdf: Path to PDF file, or an open fitz.Document
+    
+    Returns:
+        Context manager yielding the fitz.Document
+    """
+    if isinstance(pdf, fitz.Document):
+        return contextlib.nullcontext(pdf)
+    return fitz.open(pdf)
+
+
+def render_pdf_page_as_image(pdf_path, page_num, dpi=DEFAULT_DPI):
+    """
+    Render a PDF page as a high-resolution image.
+    
+    Given a path, the PDF is opened for this one page; when rendering many
+    pages, pass an open fitz.Document so its xref table is parsed only once.
+    
+    Args:
+        pdf_path: Path to PDF file, or an open fitz.Document
+        page_num (int): Page number (0-indexed)
+        dpi (int): Resolution
+    
+    Returns:
+        PIL Image
+    """
+    with _open_pdf(pdf_path) as doc:
+        return render_page(doc, page_num, dpi_matrix(dpi))
+
+
+# Length and level of detail for each note style
+_STYLE_CONFIGS = MappingProxyType({
+    'brief': {
+        'duration': '20-30 seconds',
+        'detail': 'concise and to the point',
+        'sentences': '2-4 sentences'
+    },
+    'standard': {
+        'duration': '45-60 seconds',
+        'detail': 'clear and comprehensive',
+        'sentences': '4-6 sentences'
+    },
+    'detailed': {
+        'duration': '90-120 seconds',
+        'detail': 'thorough and detailed with context and examples',
+        'sentences': '8-12 sentences'
+    }
+})
+
+# Description of each note tone
+_TONE_CONFIGS = MappingProxyType({
+    'professional': 'professional and business-appropriate',
+    'casual': 'friendly and conversational',
+    'academic': 'scholarly and research-oriented',
+    'persuasive': 'compelling and convincing',
+    'enthusiastic': 'energetic and passionate',
+    'storytelling': 'narrative-driven and engaging with stories',
+    'technical': 'precise and technically detailed',
+    'inspirational': 'motivational and uplifting',
+    'educational': 'clear and instructive for learning'
+})
+
+_PROMPT_TEMPLATE = """Analyze this presentation slide and write exactly what the presenter should say when presenting this slide.
+
+Write a natural, conversational script that:
+- Takes approximately {duration} to speak
+- Is {detail}
+- Contains {sentences}
+- Uses a {tone} tone
+- Flows smoothly and sounds natural when spoken aloud
+- Explains what's on the slide clearly
+- Is written in first person (as if you are the presenter)
+- Uses simple, clear language
+- Includes no markdown formatting, bullets, or special characters
+- Is just plain text that can be read directly
+
+Write ONLY the spoken words - nothing else. No labels, no sections, no formatting.
+Just write what needs to be said, as if you're speaking directly to the audience."""
+
+_TEXT_PROMPT_TEMPLATE = """Based on this slide content, write exactly what the presenter should say when presenting this slide.
+
+Slide content:
+{slide_text}
+
+Write a natural, conversational script that:
+- Takes approximately {duration} to speak
+- Is {detail}
+- Contains {sentences}
+- Uses a {tone} tone
+- Flows smoothly and sounds natural when spoken aloud
+- Explains the content clearly
+- Is written in first person (as if you are the presenter)
+- Uses simple, clear language
+- Includes no markdown formatting, bullets, or special characters
+- Is just plain text that can be read directly
+- Expands on the bullet points or headings with context and explanation
+
+Write ONLY the spoken words - nothing else. No labels, no sections, no formatting.
+Just write what needs to be said, as if you're speaking directly to the audience."""
+
+
+def _prompt_fields(note_style="standard", note_tone="professional"):
+    """
+    Resolve a note style and tone into the fields of the prompt templates.
+    
+    Args:
+        note_style: Style of notes - 'brief', 'standard', or 'detailed'
+        note_tone: Tone of notes - 'professional', 'casual', 'academic', or 'persuasive'
+    
+    Returns:
+        dict: duration, detail, sentences and tone
+    """
+    fields = dict(_STYLE_CONFIGS.get(note_style, _STYLE_CONFIGS['standard']))
+    fields['tone'] = _TONE_CONFIGS.get(note_tone, _TONE_CONFIGS['professional'])
+    return fields
+
+
+@functools.lru_cache(maxsize=64)
+def _image_notes_prompt(note_style="standard", note_tone="professional"):
+    """
+    Build the Gemini prompt used to write notes from a slide image.
+    
+    The prompt depends only on style and tone, so it is built once per pair.
+    
+    Args:
+        note_style: Style of notes - 'brief', 'standard', or 'detailed'
+        note_tone: Tone of notes - 'professional', 'casual', 'academic', or 'persuasive'
+    
+    Returns:
+        str: Prompt text
+    """
+    return _PROMPT_TEMPLATE.format(**_prompt_fields(note_style, note_tone))
+
+
+@functools.lru_cache(maxsize=64)
+def _image_prompt_part(note_style="standard", note_tone="professional"):
+    """
+    Return the image prompt as a request Part, shared by every slide with this style and tone.
+    
+    Returns:
+        types.Part: The prompt text part
+    """
+    return types.Part.from_text(text=_image_notes_prompt(note_style, note_tone))
+
+
+def generate_speaker_notes(image_bytes, client_pool, note_style="standard", note_tone="professional",
+                           mime_type="image/jpeg"):
+    """
+    Use Google Gemini to generate speaker notes for a slide.
+    
+    Args:
+        image_bytes (bytes): Encoded slide image, see encode_image()
+        client_pool (GeminiClientPool): API clients shared across all slides of a job
+        note_style: Style of notes - 'brief', 'standard', or 'detailed'
+        note_tone: Tone of notes - 'professional', 'casual', 'academic', or 'persuasive'
+        mime_type (str): MIME type of image_bytes
+    
+    Returns:
+        str: Generated speaker notes
+    """
+    prompt = _image_notes_prompt(note_style, note_tone)
+    model_name = _MODEL_NAME
+    cache_key = _notes_cache_key(model_name, prompt, image_bytes)
+    cached_notes = _cache_get(cache_key)
+    if cached_notes is not None:
+        return cached_notes
+    
+    prompt_part = _image_prompt_part(note_style, note_tone)
+    
+    try:
+        response_text = _generate_content_with_retry(
+            client_pool,
+            model=model_name,
+            contents=[
+                types.Part.from_bytes(
+                    data=image_bytes,
+                    mime_type=mime_type
+                ),
+                prompt_part
+            ]
+        )
+        
+        if not response_text:
+            raise ValueError("Gemini returned an empty response")
+        
+        notes = response_text.strip()
+        _cache_put(cache_key, notes)
+        return notes
+        
+    except _PROGRAMMING_ERRORS:
+        # Bugs in our own code should surface, not become placeholder notes
+        raise
+    except Exception as e:
+        print(f"    Warning: Failed to generate notes: {e}")
+        return FAILED_NOTES
+
+
+def generate_speaker_notes_batch(images, client_pool, note_style="standard", note_tone="professional"):
+    """
+    Generate notes for several slide images with a single Gemini request.
+    
+    Each image is sent as its own part, labelled "SLIDE i:", and Gemini is
+    asked for a JSON array with one script per slide. Results are cached per
+    slide under the same key generate_speaker_notes() uses.
+    
+    Args:
+        images (list): (image_bytes, mime_type) tuples, see encode_image()
+        client_pool (GeminiClientPool): API clients shared across all slides of a job
+        note_style: Style of notes - 'brief', 'standard', or 'detailed'
+        note_tone: Tone of notes - 'professional', 'casual', 'academic', or 'persuasive'
+    
+    Returns:
+        list: Notes per image, or None where the batch gave no usable answer
+    """
+    prompt = _image_notes_prompt(note_style, note_tone)
+    model_name = _MODEL_NAME
+    cache_keys = [_notes_cache_key(model_name, prompt, image_bytes) for image_bytes, _ in images]
+    results = [_cache_get(key) for key in cache_keys]
+    missing = [i for i, notes in enumerate(results) if notes is None]
+    if not missing:
+        return results
+    
+    contents = []
+    for slide_idx, i in enumerate(missing):
+        image_bytes, mime_type = images[i]
+        contents.append(types.Part.from_text(text=f"SLIDE {slide_idx}:"))
+        contents.append(types.Part.from_bytes(data=image_bytes, mime_type=mime_type))
+    contents.append(types.Part.from_text(text=f"{prompt}\n\n{_batch_instructions(len(missing))}"))
+    
+    for i, notes in zip(missing, _generate_notes_array(client_pool, model_name, contents, len(missing))):
+        if notes is not None:
+            results[i] = notes
+            _cache_put(cache_keys[i], notes)
+    return results
+
+
+def _batch_instructions(count):
+    """Tell Gemini how to answer for `count` slides labelled SLIDE 0..count-1."""
+    return (f"There are {count} slides above, labelled SLIDE 0 to SLIDE {count - 1}. "
+            f"Apply these instructions to each slide separately and return a JSON array of exactly "
+            f"{count} strings, where element i is the script for SLIDE i.")
+
+
+def _generate_notes_array(client_pool, model_name, contents, count):
+    """
+    Run a batched notes request and parse its JSON array answer.
+    
+    Args:
+        client_pool (GeminiClientPool): API clients shared across all slides of a job
+        model_name (str): Gemini model name
+        contents (list): Request parts
+        count (int): Number of slides in the request
+    
+    Returns:
+        list: count entries, each the stripped notes or None if missing or empty
+    """
+    try:
+        response_text = _generate_content_with_retry(
+            client_pool,
+            model=model_name,
+            contents=contents,
+            config=types.GenerateContentConfig(
+                response_mime_type="application/json",
+                response_schema=list[str]
+            )
+        )
+        batch_notes = json.loads(response_text or "[]")
+        if not isinstance(batch_notes, list) or len(batch_notes) != count:
+            raise ValueError(f"expected a JSON array of {count} notes")
+    except _PROGRAMMING_ERRORS:
+        raise
+    except Exception as e:
+        print(f"    Warning: Batched notes request failed: {str(e)[:100]}")
+        return [None] * count
+    
+    return [notes.strip() if isinstance(notes, str) and notes.strip() else None for notes in batch_notes]
+
+
+def _shape_type(shape):
+    """
+    Classify a shape by its MSO_SHAPE_TYPE, reading shape_type exactly once.
+    
+    Table placeholders report PLACEHOLDER, so they are mapped to TABLE here;
+    that is the only case that still needs a has_table probe.
+    
+    Args:
+        shape: python-pptx shape
+    
+    Returns:
+        MSO_SHAPE_TYPE member, or None if python-pptx can't classify the shape
+    """
+    try:
+        shape_type = shape.shape_type
+    except NotImplementedError:
+        return None
+    if shape_type == MSO_SHAPE_TYPE.PLACEHOLDER and getattr(shape, "has_table", False):
+        return MSO_SHAPE_TYPE.TABLE
+    return shape_type
+
+
+def extract_slide_text(slide):
+    """
+    Collect the text of every text frame and table cell on a PPTX slide.
+    
+    Pieces are gathered in a list and joined once: rewriting this as
+    `text += shape.text` makes extraction quadratic in the slide's text size.
+    
+    Args:
+        slide: python-pptx Slide
+    
+    Returns:
+        str: Non-empty text pieces joined by newlines
+    """
+    slide_text = []
+    try:
+        for shape in slide.shapes:
+            # Also check for text in tables
+            if _shape_type(shape) == MSO_SHAPE_TYPE.TABLE:
+                for row in shape.table.rows:
+                    for cell in row.cells:
+                        text = cell.text.strip()
+                        if text:
+                            slide_text.append(text)
+            # has_text_frame is a plain property; hasattr(shape, "text") went
+            # through python-pptx's attribute lookup and exception path
+            elif shape.has_text_frame:
+                text = shape.text_frame.text.strip()
+                if text:
+                    slide_text.append(text)
+    except Exception as e:
+        print(f"  Warning: Error extracting text: {str(e)[:100]}")
+    
+    return "\n".join(slide_text)
+
+
+@functools.lru_cache(maxsize=8)
+def _get_font(size):
+    """
+    Load a TrueType font at the given size once per process.
+    
+    Tries Arial, then fonts commonly installed on Linux servers where Arial
+    isn't, then PIL's default font (scalable on Pillow 10.1+).
+    
+    Args:
+        size (int): Font size in points
+    
+    Returns:
+        PIL ImageFont
+    """
+    from PIL import ImageFont
+    
+    for name in _FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+@functools.lru_cache(maxsize=1)
+def _picture_decode_pool():
+    """Thread pool shared by every slide render for picture decoding."""
+    return ThreadPoolExecutor(max_workers=max(1, PICTURE_DECODE_WORKERS))
+
+
+def _decode_picture(job):
+    """
+    Decode an embedded slide picture and resize it to its on-slide box.
+    
+    Args:
+        job (tuple): (image_bytes, width, height) in canvas pixels
+    
+    Returns:
+        PIL Image, or None if the picture could not be decoded
+    """
+    image_bytes, width, height = job
+    try:
+        shape_image = Image.open(io.BytesIO(image_bytes))
+        
+        # Let JPEGs decode at reduced scale (no-op for other formats),
+        # keeping 2x headroom for the final LANCZOS resize
+        shape_image.draft('RGB', (width * 2, height * 2))
+        
+        # reducing_gap box-reduces large downscales by an integer factor first,
+        # so LANCZOS only filters the last <3x step (PNGs get no draft() help)
+        return shape_image.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+    except Exception:
+        return None
+
+
+@functools.lru_cache(maxsize=50000)
+def _text_width(font, text):
+    """Pixel width of text in a font; slide vocabulary repeats, so this is memoized."""
+    try:
+        return font.getlength(text)
+    except AttributeError:
+        return len(text) * 10
+
 
-def render_pdf_page_as_image(pdf_path, page_num, dpi=300):
+def _wrap_text_px(text, font, max_width, max_lines):
     """
-    Render a PDF page as a high-resolution image.
+    Greedily wrap text to a pixel width, measuring each distinct word once.
     
     Args:
-        pdf_path (str): Path to PDF file
-        page_num (int): Page number (0-indexed)
-        dpi (int): Resolution
+        text (str): Text to wrap (any whitespace separates words)
+        font: PIL ImageFont the text will be drawn with
+        max_width (int): Line width in pixels
+        max_lines (int): Stop after this many lines
     
     Returns:
-        PIL Image
+        list: Wrapped lines
     """
-    doc = fitz.open(pdf_path)
-    page = doc[page_num]
-    
-    # Render page to image
-    zoom = dpi / 72
-    mat = fitz.Matrix(zoom, zoom)
-    pix = page.get_pixmap(matrix=mat)
-    
-    # Convert to PIL Image
-    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-    
-    doc.close()
-    return img
+    space = _text_width(font, " ")
+    lines = []
+    line, line_width = [], 0
+    for word in text.split():
+        word_width = _text_width(font, word)
+        if line and line_width + space + word_width > max_width:
+            lines.append(" ".join(line))
+            if len(lines) == max_lines:
+                return lines
+            line, line_width = [], 0
+        line_width += word_width + (space if line else 0)
+        line.append(word)
+    if line:
+        lines.append(" ".join(line))
+    return lines
 
 
-def generate_speaker_notes(image, api_key, note_style="standard", note_tone="professional"):
+def render_slide_as_image(prs, slide_idx, temp_dir="temp_slides"):
     """
-    Use Google Gemini to generate speaker notes for a slide.
+    Create a visual representation of a PPTX slide with text overlay.
     
     Args:
-        image: PIL Image of the slide
-        api_key: Google AI API key
-        note_style: Style of notes - 'brief', 'standard', or 'detailed'
-        note_tone: Tone of notes - 'professional', 'casual', 'academic', or 'persuasive'
+        prs: Presentation object
+        slide_idx (int): Index of slide to render
+        temp_dir (str): Directory for temporary files
     
     Returns:
-        str: Generated speaker notes
+        PIL Image or None
     """
-    # Convert image to bytes
-    img_byte_arr = io.BytesIO()
-    image.save(img_byte_arr, format='PNG')
-    img_byte_arr = img_byte_arr.getvalue()
-    
-    # Initialize Gemini client
-    client = genai.Client(api_key=api_key)
-    
-    # Configure style based on selection
-    style_configs = {
-        'brief': {
-            'duration': '20-30 seconds',
-            'detail': 'concise and to the point',
-            'sentences': '2-4 sentences'
-        },
-        'standard': {
-            'duration': '45-60 seconds',
-            'detail': 'clear and comprehensive',
-            'sentences': '4-6 sentences'
-        },
-        'detailed': {
-            'duration': '90-120 seconds',
-            'detail': 'thorough and detailed with context and examples',
-            'sentences': '8-12 sentences'
-        }
-    }
-    
-    # Configure tone based on selection
-    tone_configs = {
-        'professional': 'professional and business-appropriate',
-        'casual': 'friendly and conversational',
-        'academic': 'scholarly and research-oriented',
-        'persuasive': 'compelling and convincing',
-        'enthusiastic': 'energetic and passionate',
-        'storytelling': 'narrative-driven and engaging with stories',
-        'technical': 'precise and technically detailed',
-        'inspirational': 'motivational and uplifting',
-        'educational': 'clear and instructive for learning',
-        'enthusiastic': 'energetic and passionate',
-        'storytelling': 'narrative-driven and engaging with stories',
-        'technical': 'precise and technically detailed',
-        'inspirational': 'motivational and uplifting',
-        'educational': 'clear and instructive for learning'
-    }
+    return render_slide_with_text(prs, slide_idx)[0]
+
+
+def _slide_render_key(prs, slide):
+    """
+    Fingerprint everything render_slide_with_text() draws from.
     
-    style_config = style_configs.get(note_style, style_configs['standard'])
-    tone_description = tone_configs.get(note_tone, tone_configs['professional'])
+    Args:
+        prs: Presentation object
+        slide: python-pptx Slide
     
-    prompt = f"""Analyze this presentation slide and write exactly what the presenter should say when presenting this slide.
-
-Write a natural, conversational script that:
-- Takes approximately {style_config['duration']} to speak
-- Is {style_config['detail']}
-- Contains {style_config['sentences']}
-- Uses a {tone_description} tone
-- Flows smoothly and sounds natural when spoken aloud
-- Explains what's on the slide clearly
-- Is written in first person (as if you are the presenter)
-- Uses simple, clear language
-- Includes no markdown formatting, bullets, or special characters
-- Is just plain text that can be read directly
+    Returns:
+        str: BLAKE2b hex digest of the slide size, slide XML and picture blobs
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{_RENDER_VERSION}|{prs.slide_width}|{prs.slide_height}|".encode())
+    digest.update(slide._element.xml.encode())
+    # Every picture's blob hangs off an image relationship of the slide part,
+    # so there's no need to build shape proxies to find them
+    for rel_id, rel in sorted(slide.part.rels.items()):
+        if rel.reltype == RT.IMAGE and not rel.is_external:
+            digest.update(rel.target_part.blob)
+    return digest.hexdigest()
 
-Write ONLY the spoken words - nothing else. No labels, no sections, no formatting.
-Just write what needs to be said, as if you're speaking directly to the audience."""
 
+def prune_render_cache(max_age=RENDER_CACHE_TTL_SECONDS, max_bytes=RENDER_CACHE_MAX_BYTES):
+    """
+    Delete expired slide renders, then the least recently used ones over the size cap.
+    
+    Each entry's PNG and text file are removed together (text first, since
+    its presence marks the entry complete), so a lookup never finds text
+    whose picture is gone.
+    
+    Args:
+        max_age (float): Seconds an entry is kept since it was last used (0 = no limit)
+        max_bytes (int): Total size the cache may occupy (0 = no limit)
+    """
+    entries = {}  # key -> [last used, total size, paths]
     try:
-        model_name = os.environ.get('GEMINI_MODEL', 'gemini-3-flash-preview')
-        response = client.models.generate_content(
-            model=model_name,
-            contents=[
-                types.Part.from_bytes(
-                    data=img_byte_arr,
-                    mime_type='image/png'
-                ),
-                types.Part.from_text(text=prompt)
-            ]
-        )
-        
-        notes = response.text.strip()
-        return notes
-        
-    except Exception as e:
-        print(f"    Warning: Failed to generate notes: {e}")
-        return "Speaker notes could not be generated for this slide."
+        for path in Path(RENDER_CACHE_DIR).iterdir():
+            stat = path.stat()
+            entry = entries.setdefault(path.name.split(".", 1)[0], [0.0, 0, []])
+            entry[0] = max(entry[0], stat.st_mtime)
+            entry[1] += stat.st_size
+            entry[2].append(path)
+    except FileNotFoundError:
+        return
+    except OSError as e:
+        print(f"    Warning: Could not scan slide render cache: {str(e)[:100]}")
+        return
+    
+    cutoff = time.time() - max_age if max_age > 0 else 0.0
+    total_bytes = sum(size for _, size, _ in entries.values())
+    for last_used, size, paths in sorted(entries.values(), key=lambda entry: entry[0]):
+        if last_used >= cutoff and (max_bytes <= 0 or total_bytes <= max_bytes):
+            break
+        for path in sorted(paths, key=lambda path: path.suffix != ".txt"):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+        total_bytes -= size
 
 
-def render_slide_as_image(prs, slide_idx, temp_dir="temp_slides"):
+def render_slide_with_text(prs, slide_idx):
     """
-    Create a visual representation of a PPTX slide with text overlay.
+    Render a PPTX slide and extract its text in a single pass over its shapes.
+    
+    Every shape access goes through python-pptx's XML layer, so callers that
+    need both the picture and the text should use this instead of
+    render_slide_as_image() plus extract_slide_text().
+    
+    Results are cached on disk under RENDER_CACHE_DIR, keyed by the slide's
+    XML and embedded pictures, so re-running on the same deck (e.g. with a
+    different style or tone) skips the shape walk and PIL compositing.
+    Entries are evicted by prune_render_cache().
     
     Args:
         prs: Presentation object
         slide_idx (int): Index of slide to render
-        temp_dir (str): Directory for temporary files
     
     Returns:
-        PIL Image or None
+        tuple: (PIL Image or None, text as returned by extract_slide_text())
     """
+    if not _render_cache_enabled:
+        return _render_slide_uncached(prs, slide_idx)
+    
     try:
-        from PIL import ImageDraw, ImageFont
-        
-        source_slide = prs.slides[slide_idx]
+        key = _slide_render_key(prs, prs.slides[slide_idx])
+        image_path = Path(RENDER_CACHE_DIR) / f"{key}.png"
+        text_path = Path(RENDER_CACHE_DIR) / f"{key}.txt"
+        if text_path.exists():
+            slide_image = None
+            if image_path.exists():
+                slide_image = Image.open(image_path)
+                slide_image.load()
+            combined_text = text_path.read_text(encoding="utf-8")
+            # The text file's mtime is the entry's last use, see prune_render_cache()
+            os.utime(text_path)
+            return slide_image, combined_text
+    except Exception as e:
+        print(f"    Warning: Slide render cache lookup failed: {str(e)[:100]}")
+        return _render_slide_uncached(prs, slide_idx)
+    
+    slide_image, combined_text = _render_slide_uncached(prs, slide_idx)
+    
+    # Write to temporary names and rename, so readers never see a partial file;
+    # the text file goes last because its presence marks the entry complete
+    try:
+        image_path.parent.mkdir(parents=True, exist_ok=True)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        if slide_image is not None:
+            # Favour encode speed: this file is only ever read back by this cache
+            slide_image.save(str(image_path) + suffix, format='PNG', compress_level=1)
+            os.replace(str(image_path) + suffix, image_path)
+        Path(str(text_path) + suffix).write_text(combined_text, encoding="utf-8")
+        os.replace(str(text_path) + suffix, text_path)
+    except Exception as e:
+        print(f"    Warning: Could not cache slide render: {str(e)[:100]}")
+    
+    return slide_image, combined_text
+
+
+def _render_slide_uncached(prs, slide_idx):
+    """Do the actual work of render_slide_with_text()."""
+    source_slide = prs.slides[slide_idx]
+    slide_text = []
+    
+    try:
+        from PIL import ImageDraw
         
-        # Get slide dimensions
-        slide_width_inches = prs.slide_width.inches
-        slide_height_inches = prs.slide_height.inches
+        # Get slide dimensions (read once; each access goes through the XML)
+        slide_width, slide_height = prs.slide_width, prs.slide_height
+        slide_width_inches = slide_width.inches
+        slide_height_inches = slide_height.inches
         
         # Create a canvas with slide dimensions at 150 DPI
         dpi = 150
@@ -177,100 +1390,101 @@ def render_slide_as_image(prs, slide_idx, temp_dir="temp_slides"):
         slide_image = Image.new('RGB', (img_width, img_height), color='white')
         draw = ImageDraw.Draw(slide_image)
         
-        # Try to load a font (fallback to default if not available)
-        try:
-            font = ImageFont.truetype("arial.ttf", 20)
-            font_small = ImageFont.truetype("arial.ttf", 16)
-        except:
-            font = ImageFont.load_default()
-            font_small = ImageFont.load_default()
+        # Fonts are loaded once per process (fallback to default if not available)
+        font_small = _get_font(16)
         
         has_content = False
         
-        # Process all shapes in the slide
+        # Slide size as plain EMU ints, shared by every shape's EMU -> pixel mapping
+        slide_width_emu, slide_height_emu = int(slide_width), int(slide_height)
+        
+        # First pass: read text and geometry from every shape. Drawing is deferred
+        # so all of the slide's pictures can be decoded in parallel below
+        draw_ops = []
+        picture_jobs = []
         for shape in source_slide.shapes:
+            # Collect text first, so a shape that can't be drawn still contributes it
+            text = ""
+            cell_texts = None
+            shape_type = _shape_type(shape)
+            try:
+                if shape_type == MSO_SHAPE_TYPE.TABLE:
+                    cell_texts = [[cell.text.strip() for cell in row.cells] for row in shape.table.rows]
+                    slide_text.extend(cell_text for row in cell_texts for cell_text in row if cell_text)
+                elif shape_type != MSO_SHAPE_TYPE.PICTURE and shape.has_text_frame:
+                    text = shape.text_frame.text.strip()
+                    if text:
+                        slide_text.append(text)
+            except Exception as e:
+                print(f"  Warning: Error extracting text: {str(e)[:100]}")
+            
+            try:
+                # Calculate position and size
+                left = shape.left * img_width // slide_width_emu
+                top = shape.top * img_height // slide_height_emu
+                width = shape.width * img_width // slide_width_emu
+                height = shape.height * img_height // slide_height_emu
+                
+                # Pictures are queued for decoding; everything keeps its z-order
+                if shape_type == MSO_SHAPE_TYPE.PICTURE:
+                    if width > 0 and height > 0:
+                        draw_ops.append(('picture', left, top, width, height, len(picture_jobs)))
+                        picture_jobs.append((shape.image.blob, width, height))
+                elif text:
+                    draw_ops.append(('text', left, top, width, height, text))
+                elif cell_texts is not None:
+                    draw_ops.append(('table', left, top, width, height, cell_texts))
+            except Exception:
+                # Skip shapes that cause errors
+                continue
+        
+        # Decode and resize all pictures at once; a single one isn't worth the hand-off
+        if len(picture_jobs) > 1:
+            pictures = list(_picture_decode_pool().map(_decode_picture, picture_jobs))
+        else:
+            pictures = [_decode_picture(job) for job in picture_jobs]
+        
+        # Second pass: composite in slide order
+        for kind, left, top, width, height, payload in draw_ops:
             try:
                 # Handle pictures
-                if shape.shape_type == 13:  # Picture type
-                    image = shape.image
-                    image_bytes = image.blob
-                    shape_image = Image.open(io.BytesIO(image_bytes))
-                    
-                    # Calculate position and size
-                    left = int((shape.left / prs.slide_width) * img_width)
-                    top = int((shape.top / prs.slide_height) * img_height)
-                    width = int((shape.width / prs.slide_width) * img_width)
-                    height = int((shape.height / prs.slide_height) * img_height)
-                    
-                    # Resize and paste
-                    shape_image = shape_image.resize((width, height), Image.LANCZOS)
+                if kind == 'picture':
+                    shape_image = pictures[payload]
+                    if shape_image is None:
+                        continue
                     slide_image.paste(shape_image, (left, top))
                     has_content = True
                 
                 # Handle text boxes and shapes with text
-                elif hasattr(shape, "text") and shape.text.strip():
-                    text = shape.text.strip()
-                    
-                    # Calculate position and size
-                    left = int((shape.left / prs.slide_width) * img_width)
-                    top = int((shape.top / prs.slide_height) * img_height)
-                    width = int((shape.width / prs.slide_width) * img_width)
-                    height = int((shape.height / prs.slide_height) * img_height)
-                    
+                elif kind == 'text':
                     # Draw a light background for text
                     draw.rectangle([left, top, left + width, top + height], 
                                  fill='#f0f0f0', outline='#cccccc')
                     
-                    # Draw text (simplified - just the first 500 chars)
-                    text_display = text[:500]
-                    # Wrap text to fit width
-                    words = text_display.split()
-                    lines = []
-                    current_line = ""
-                    
-                    for word in words:
-                        test_line = current_line + " " + word if current_line else word
-                        # Rough estimate - 10 pixels per char
-                        if len(test_line) * 10 < width:
-                            current_line = test_line
-                        else:
-                            if current_line:
-                                lines.append(current_line)
-                            current_line = word
-                    
-                    if current_line:
-                        lines.append(current_line)
-                    
-                    # Draw the lines
-                    y_offset = top + 10
-                    for line in lines[:10]:  # Limit to 10 lines
-                        draw.text((left + 10, y_offset), line, fill='black', font=font_small)
-                        y_offset += 25
+                    # Draw text (simplified - just the first 500 chars), wrapped to
+                    # the box width and limited to 10 lines, in a single call
+                    lines = _wrap_text_px(payload[:500], font_small, width - 20, max_lines=10)
+                    draw.multiline_text((left + 10, top + 10), "\n".join(lines),
+                                        fill='black', font=font_small, spacing=9)
                     
                     has_content = True
                 
                 # Handle tables
-                elif hasattr(shape, "has_table") and shape.has_table:
-                    table = shape.table
-                    left = int((shape.left / prs.slide_width) * img_width)
-                    top = int((shape.top / prs.slide_height) * img_height)
-                    width = int((shape.width / prs.slide_width) * img_width)
-                    height = int((shape.height / prs.slide_height) * img_height)
-                    
+                else:
                     # Draw table border
                     draw.rectangle([left, top, left + width, top + height], 
                                  outline='#666666', width=2)
                     
                     # Draw simplified table representation
-                    row_height = height // len(table.rows) if len(table.rows) > 0 else 30
+                    row_height = height // len(payload) if len(payload) > 0 else 30
                     y_pos = top
                     
-                    for row in table.rows[:5]:  # Limit to first 5 rows
+                    for row in payload[:5]:  # Limit to first 5 rows
                         x_pos = left
-                        col_width = width // len(row.cells) if len(row.cells) > 0 else 100
+                        col_width = width // len(row) if len(row) > 0 else 100
                         
-                        for cell in row.cells[:5]:  # Limit to first 5 columns
-                            cell_text = cell.text.strip()[:30]  # Limit text length
+                        for cell_text in row[:5]:  # Limit to first 5 columns
+                            cell_text = cell_text[:30]  # Limit text length
                             if cell_text:
                                 draw.text((x_pos + 5, y_pos + 5), cell_text, 
                                         fill='black', font=font_small)
@@ -280,212 +1494,777 @@ def render_slide_as_image(prs, slide_idx, temp_dir="temp_slides"):
                     
                     has_content = True
                     
-            except Exception as e:
+            except Exception:
                 # Skip shapes that cause errors
                 continue
         
         # Return the image if we found any content
         if has_content:
-            return slide_image
+            return slide_image, "\n".join(slide_text)
         else:
-            return None
+            return None, "\n".join(slide_text)
             
     except Exception as e:
         print(f"    Warning: Could not render slide as image: {str(e)[:100]}")
+        return None, extract_slide_text(source_slide)
+
+
+def _notes_for_slide(slide_num, slide_image, combined_text, client_pool,
+                     note_style="standard", note_tone="professional", encoded_image=None):
+    """
+    Generate notes for one PPTX slide, preferring the visual render over plain text.
+    
+    Args:
+        slide_num (int): 1-based slide number (for logging)
+        slide_image: PIL Image of the slide, or None
+        combined_text (str): Text extracted from the slide's shapes
+        client_pool (GeminiClientPool): API clients shared across all slides of a job
+        note_style: Style of notes - 'brief', 'standard', or 'detailed'
+        note_tone: Tone of notes - 'professional', 'casual', 'academic', or 'persuasive'
+        encoded_image (tuple): (image_bytes, mime_type) of slide_image already
+            encoded for Gemini, to avoid encoding it again
+    
+    Returns:
+        str: Speaker notes for the slide
+    """
+    # A re-export of a slide seen before (same text, near-identical render), if enabled
+    near_entry = _near_duplicate_entry(combined_text, slide_image or None, note_style, note_tone)
+    notes = _near_duplicate_get(near_entry)
+    if notes is not None:
+        return notes
+    
+    # Strategy: Use image if available for better context, otherwise use text
+    if slide_image:
+        try:
+            image_bytes, mime_type = encoded_image or encode_image(slide_image, max_px=GEMINI_MAX_PX)
+            notes = generate_speaker_notes(image_bytes, client_pool, note_style, note_tone, mime_type)
+            if notes == FAILED_NOTES:
+                # Retries are exhausted for the image; the text prompt may still succeed
+                notes = None
+            else:
+                _near_duplicate_put(near_entry, notes)
+        except Exception as e:
+            print(f"  Slide {slide_num}: Image-based analysis failed: {str(e)[:100]}")
+            notes = None
+    
+    # Fallback to text-only approach if image analysis failed or no image
+    if notes is None and combined_text:
+        try:
+            notes = generate_notes_from_text(combined_text, client_pool, note_style, note_tone)
+            _near_duplicate_put(near_entry, notes)
+        except Exception as e:
+            print(f"  Slide {slide_num}: Error generating notes: {str(e)[:100]}")
+            notes = "This slide contains content but speaker notes could not be generated. Please review and add custom notes."
+    
+    # If we still don't have notes, provide a default message
+    if notes is None:
+        print(f"  Slide {slide_num}: No content found in slide")
+        notes = EMPTY_SLIDE_NOTES
+    
+    return notes
+
+
+def _trivial_slide_notes(slide, combined_text):
+    """
+    Notes for a slide too bare to be worth a Gemini call.
+    
+    Blank slides and bare dividers ("Q&A", "Thanks!") don't need the API:
+    the slide's own words are the script. Slides with pictures always go to
+    Gemini, since the text says nothing about them.
+    
+    Args:
+        slide: python-pptx Slide
+        combined_text (str): Text extracted from the slide's shapes
+    
+    Returns:
+        str: Notes to use as-is, or None if the slide needs Gemini
+    """
+    text = combined_text.strip()
+    if len(text) >= MIN_SLIDE_TEXT_CHARS:
         return None
+    if _has_picture(slide):
+        return None
+    return text or EMPTY_SLIDE_NOTES
+
+
+def _has_picture(slide):
+    """
+    Check whether a PPTX slide has any picture shapes.
+    
+    Our slide renders only draw pictures, text boxes and tables; without a
+    picture the render shows Gemini nothing the slide's text doesn't, so
+    such slides are cheaper to send as a text prompt.
+    
+    Args:
+        slide: python-pptx Slide
+    
+    Returns:
+        bool: True if at least one shape is a picture
+    """
+    # Same rule python-pptx uses for MSO_SHAPE_TYPE.PICTURE (placeholders and
+    # movies are <p:pic> too), evaluated by lxml without creating shape objects
+    return bool(slide.element.xpath(_PICTURE_XPATH))
+
+
+_PICTURE_XPATH = (
+    "./p:cSld/p:spTree/p:pic[not(p:nvPicPr/p:nvPr/p:ph) and not(p:nvPicPr/p:nvPr/a:videoFile)]"
+)
+
+
+def _notes_for_slide_batch(batch, client_pool, note_style="standard", note_tone="professional"):
+    """
+    Generate notes for a run of PPTX slides, sending their renders in one request.
+    
+    Slides whose render failed but that have text are batched into one text
+    request instead. Anything a batched request gave no answer for falls back
+    to _notes_for_slide() one at a time.
+    
+    Args:
+        batch (list): (slide_index, slide_image, combined_text) tuples
+        client_pool (GeminiClientPool): API clients shared across all slides of a job
+        note_style: Style of notes - 'brief', 'standard', or 'detailed'
+        note_tone: Tone of notes - 'professional', 'casual', 'academic', or 'persuasive'
+    
+    Returns:
+        list: Speaker notes in the same order as batch
+    """
+    # Slides the near-duplicate cache already knows need no request at all
+    near_entries = [
+        _near_duplicate_entry(combined_text, slide_image or None, note_style, note_tone)
+        for _, slide_image, combined_text in batch
+    ]
+    batch_notes = {}
+    for position, entry in enumerate(near_entries):
+        notes = _near_duplicate_get(entry)
+        if notes is not None:
+            batch_notes[position] = notes
+    
+    images = {}
+    for position, (idx, slide_image, _) in enumerate(batch):
+        if slide_image and position not in batch_notes:
+            try:
+                images[position] = encode_image(slide_image, max_px=GEMINI_MAX_PX)
+            except Exception as e:
+                print(f"  Slide {idx + 1}: Could not encode slide image: {str(e)[:100]}")
+    
+    if len(images) > 1:
+        results = generate_speaker_notes_batch(list(images.values()), client_pool, note_style, note_tone)
+        for position, notes in zip(images, results):
+            if notes is not None:
+                batch_notes[position] = notes
+                _near_duplicate_put(near_entries[position], notes)
+    
+    texts = {
+        position: combined_text
+        for position, (_, _, combined_text) in enumerate(batch)
+        if position not in images and position not in batch_notes and combined_text.strip()
+    }
+    if len(texts) > 1:
+        results = generate_notes_from_text_batch(list(texts.values()), client_pool, note_style, note_tone)
+        for position, notes in zip(texts, results):
+            if notes is not None:
+                batch_notes[position] = notes
+                _near_duplicate_put(near_entries[position], notes)
+    
+    return [
+        batch_notes.get(position)
+        or _notes_for_slide(idx + 1, slide_image, combined_text, client_pool, note_style, note_tone,
+                            images.get(position))
+        for position, (idx, slide_image, combined_text) in enumerate(batch)
+    ]
+
+
+def add_notes_to_pptx(input_pptx, output_pptx, api_key, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Add AI-generated speaker notes to an existing PPTX file.
+    Extracts text and images directly from slides for analysis.
+    
+    Args:
+        input_pptx (str): Path to input PPTX file
+        output_pptx (str): Path for output PPTX file
+        api_key (str): Google AI API key
+        concurrency (int): Maximum number of Gemini requests in flight
+    
+    Returns:
+        str: Path to created PPTX file
+    """
+    print(f"Adding speaker notes to: {input_pptx}")
+    print(f"Output PPTX: {output_pptx}")
+    print(f"Using Google Gemini for speaker notes generation...\n")
+    
+    # Open existing presentation
+    prs = Presentation(input_pptx)
+    num_slides = len(prs.slides)
+    print(f"Total slides: {num_slides}\n")
+    if _render_cache_enabled:
+        prune_render_cache()
+    
+    # GEMINI_BATCH_SIZE slides go to Gemini per request to amortize per-request overhead
+    batch_size = max(1, GEMINI_BATCH_SIZE)
+    print(f"Generating speaker notes with AI ({concurrency} concurrent requests, "
+          f"{batch_size} slides per request)...\n")
+    client_pool = GeminiClientPool(load_api_keys(api_key))
+    
+    # Phase 1: extract text and render each slide on this thread (python-pptx is
+    # not thread-safe); each full batch goes to Gemini while later slides render
+    notes_list = [None] * num_slides
+    submitted = []
+    batch = []
+    skipped = 0
+    with _notes_executor(concurrency) as executor:
+        for idx, slide in enumerate(prs.slides):
+            print(f"{'='*60}")
+            print(f"Preparing slide {idx + 1}/{num_slides}...")
+            print(f"{'='*60}")
+            
+            # Extract text and create a visual representation in one pass over the shapes;
+            # text-only slides skip the render and go to Gemini as a text prompt
+            if _has_picture(slide):
+                slide_image, combined_text = render_slide_with_text(prs, idx)
+            else:
+                slide_image, combined_text = None, extract_slide_text(slide)
+            
+            trivial_notes = _trivial_slide_notes(slide, combined_text)
+            if trivial_notes is not None:
+                print("  Skipping AI: slide has no pictures and almost no text")
+                notes_list[idx] = trivial_notes
+                skipped += 1
+                continue
+            
+            if slide_image:
+                print(f"  Created slide visual representation ({len(combined_text)} chars of text)")
+            else:
+                print(f"  Using slide text only ({len(combined_text)} chars)")
+            batch.append((idx, slide_image, combined_text))
+            if len(batch) == batch_size:
+                submitted.append((batch, executor.submit(_notes_for_slide_batch, batch, client_pool)))
+                batch = []
+        
+        if batch:
+            submitted.append((batch, executor.submit(_notes_for_slide_batch, batch, client_pool)))
+        
+        if skipped:
+            print(f"\n{skipped} near-empty slides skipped without calling Gemini")
+        
+        # Phase 2: collect the notes as the concurrent requests finish
+        print("\nWaiting for speaker notes...\n")
+        for batch, future in submitted:
+            for (idx, _, _), notes in zip(batch, future.result()):
+                notes_list[idx] = notes
+    
+    # Phase 3: attach notes to slides in order
+    for idx, (slide, notes) in enumerate(zip(prs.slides, notes_list)):
+        try:
+            notes_slide = slide.notes_slide
+            text_frame = notes_slide.notes_text_frame
+            text_frame.text = notes
+            
+            print(f"  ✓ Slide {idx + 1} completed with notes")
+            print(f"  Notes preview: {notes[:100]}...\n")
+        except Exception as e:
+            print(f"  Error adding notes to slide {idx + 1}: {str(e)[:100]}\n")
+    
+    # Save presentation
+    print(f"{'='*60}")
+    print(f"Saving presentation: {output_pptx}")
+    _save_presentation(prs, output_pptx)
+    print("✓ Conversion completed successfully!")
+    _report_failed_notes(notes_list.count(FAILED_NOTES))
+    print(f"{'='*60}\n")
+    
+    return output_pptx
+
+
+# Times _fit_text_prompt() shrinks the text and recounts before cutting it to the byte bound
+_FIT_PROMPT_ATTEMPTS = 3
+
+# Token counts of recent prompts, least recently used first, see _count_tokens()
+_TOKEN_COUNT_CACHE_SIZE = 1024
+_token_counts = OrderedDict()
+_token_counts_lock = threading.Lock()
+
+
+def _count_tokens(client_pool, model_name, prompt):
+    """
+    Count the tokens of a prompt with Gemini's tokenizer, memoized for recent prompts.
+    
+    The memo is keyed by a digest of model and prompt only, so counts are
+    shared across jobs without keeping their client pools or prompts alive.
+    
+    Args:
+        client_pool (GeminiClientPool): Clients to rotate across
+        model_name (str): Gemini model name
+        prompt (str): Prompt text
+    
+    Returns:
+        int: Token count
+    """
+    key = hashlib.sha256(f"{model_name}\0{prompt}".encode()).digest()
+    with _token_counts_lock:
+        if key in _token_counts:
+            _token_counts.move_to_end(key)
+            return _token_counts[key]
+    
+    _, client = client_pool.acquire()
+    tokens = client.models.count_tokens(model=model_name, contents=prompt).total_tokens
+    with _token_counts_lock:
+        _token_counts[key] = tokens
+        while len(_token_counts) > _TOKEN_COUNT_CACHE_SIZE:
+            _token_counts.popitem(last=False)
+    return tokens
+
+
+def _fit_text_prompt(slide_text, client_pool, model_name, note_style="standard", note_tone="professional"):
+    """
+    Build the text prompt, truncating slide_text if it exceeds GEMINI_MAX_INPUT_TOKENS.
+    
+    Every token covers at least one UTF-8 byte, so prompts with fewer bytes
+    than the budget are returned without asking the tokenizer. Longer ones
+    are shrunk and recounted, since a character can be several tokens (CJK,
+    emoji, byte fallback); if that does not converge, the text is cut to the
+    byte bound, which always fits.
+    
+    Args:
+        slide_text (str): Text content from slide
+        client_pool (GeminiClientPool): Clients to rotate across
+        model_name (str): Gemini model name
+        note_style: Style of notes - 'brief', 'standard', or 'detailed'
+        note_tone: Tone of notes - 'professional', 'casual', 'academic', or 'persuasive'
+    
+    Returns:
+        str: Prompt text within the token budget
+    """
+    marker = "...[truncated]"
+    prompt = _text_notes_prompt(slide_text, note_style, note_tone)
+    if len(prompt.encode("utf-8")) <= GEMINI_MAX_INPUT_TOKENS:
+        return prompt
+    
+    keep = len(slide_text)
+    for attempt in range(_FIT_PROMPT_ATTEMPTS + 1):
+        try:
+            tokens = _count_tokens(client_pool, model_name, prompt)
+        except _PROGRAMMING_ERRORS:
+            raise
+        except Exception as e:
+            print(f"    Warning: Could not count prompt tokens: {str(e)[:100]}")
+            return prompt
+        
+        if tokens <= GEMINI_MAX_INPUT_TOKENS:
+            return prompt
+        if attempt == 0:
+            print(f"    Slide text is {tokens} tokens, truncating to fit {GEMINI_MAX_INPUT_TOKENS}")
+        if attempt == _FIT_PROMPT_ATTEMPTS:
+            break
+        
+        # Keep the same share of characters as the share of tokens that fits, with headroom
+        keep = int(keep * GEMINI_MAX_INPUT_TOKENS / tokens * 0.9)
+        prompt = _text_notes_prompt(slide_text[:keep] + marker, note_style, note_tone)
+    
+    # Still over: cut the text so the whole prompt is within the budget in bytes
+    head, tail = _text_prompt_parts(note_style, note_tone)
+    room = max(0, GEMINI_MAX_INPUT_TOKENS - len((head + marker + tail).encode("utf-8")))
+    text = slide_text.encode("utf-8")[:room].decode("utf-8", errors="ignore")
+    return _text_notes_prompt(text + marker, note_style, note_tone)
+
+
+def _text_notes_prompt(slide_text, note_style="standard", note_tone="professional"):
+    """
+    Build the Gemini prompt used to write notes from slide text.
+    
+    Args:
+        slide_text (str): Text content from slide
+        note_style: Style of notes - 'brief', 'standard', or 'detailed'
+        note_tone: Tone of notes - 'professional', 'casual', 'academic', or 'persuasive'
+    
+    Returns:
+        str: Prompt text
+    """
+    head, tail = _text_prompt_parts(note_style, note_tone)
+    return head + slide_text + tail
 
 
-def add_notes_to_pptx(input_pptx, output_pptx, api_key):
+@functools.lru_cache(maxsize=64)
+def _text_prompt_parts(note_style="standard", note_tone="professional"):
     """
-    Add AI-generated speaker notes to an existing PPTX file.
-    Extracts text and images directly from slides for analysis.
+    Format the text prompt template once per style and tone.
+    
+    Returns:
+        tuple: (text before the slide content, text after it)
+    """
+    placeholder = "{slide_text}"
+    prompt = _TEXT_PROMPT_TEMPLATE.format(slide_text=placeholder, **_prompt_fields(note_style, note_tone))
+    head, _, tail = prompt.partition(placeholder)
+    return head, tail
+
+
+def generate_notes_from_text(slide_text, client_pool, note_style="standard", note_tone="professional"):
+    """
+    Generate speaker notes from slide text content.
     
     Args:
-        input_pptx (str): Path to input PPTX file
-        output_pptx (str): Path for output PPTX file
-        api_key (str): Google AI API key
+        slide_text (str): Text content from slide
+        client_pool (GeminiClientPool): API clients shared across all slides of a job
+        note_style: Style of notes - 'brief', 'standard', or 'detailed'
+        note_tone: Tone of notes - 'professional', 'casual', 'academic', or 'persuasive'
     
     Returns:
-        str: Path to created PPTX file
+        str: Generated speaker notes
     """
-    print(f"Adding speaker notes to: {input_pptx}")
-    print(f"Output PPTX: {output_pptx}")
-    print(f"Using Google Gemini for speaker notes generation...\n")
+    if not slide_text or not slide_text.strip():
+        return "This slide appears to contain visual content without text. Please review the slide and add appropriate speaker notes."
     
-    # Open existing presentation
-    prs = Presentation(input_pptx)
-    num_slides = len(prs.slides)
-    print(f"Total slides: {num_slides}\n")
+    model_name = _MODEL_NAME
+    cache_key = _notes_cache_key(model_name, _text_notes_prompt(slide_text, note_style, note_tone),
+                                 slide_text.encode())
+    cached_notes = _cache_get(cache_key)
+    if cached_notes is not None:
+        return cached_notes
     
-    # Process each slide
-    for idx, slide in enumerate(prs.slides):
-        print(f"{'='*60}")
-        print(f"Processing slide {idx + 1}/{num_slides}...")
-        print(f"{'='*60}")
+    try:
+        prompt = _fit_text_prompt(slide_text, client_pool, model_name, note_style, note_tone)
+        response_text = _generate_content_with_retry(
+            client_pool,
+            model=model_name,
+            contents=[
+                types.Part.from_text(text=prompt)
+            ]
+        )
         
-        notes = None
+        if not response_text:
+            raise ValueError("Gemini returned an empty response")
         
-        # Extract text content from slide first
-        slide_text = []
-        try:
-            for shape in slide.shapes:
-                if hasattr(shape, "text"):
-                    text = shape.text.strip()
-                    if text:
-                        slide_text.append(text)
-                # Also check for text in tables
-                if hasattr(shape, "has_table") and shape.has_table:
-                    for row in shape.table.rows:
-                        for cell in row.cells:
-                            text = cell.text.strip()
-                            if text:
-                                slide_text.append(text)
-        except Exception as e:
-            print(f"  Warning: Error extracting text: {str(e)[:100]}")
+        notes = response_text.strip()
+        _cache_put(cache_key, notes)
+        return notes
         
-        combined_text = "\n".join(slide_text)
+    except _PROGRAMMING_ERRORS:
+        # Bugs in our own code should surface, not become placeholder notes
+        raise
+    except Exception as e:
+        print(f"    Warning: Failed to generate notes: {e}")
+        return FAILED_NOTES
+
+
+class NotesCheckpoint:
+    """
+    Resume state for a PDF conversion: a JSONL manifest of finished notes plus a partial PPTX.
+    
+    The manifest lives next to the output as <output>.notes.jsonl. Its first
+    line identifies the source PDF, so a manifest left by a different file
+    is ignored. Every CHECKPOINT_EVERY recorded pages the presentation is
+    also saved to <output>.partial.
+    """
+    
+    def __init__(self, pdf_path, output_pptx, prs, every=CHECKPOINT_EVERY):
+        self.manifest_path = output_pptx + ".notes.jsonl"
+        self.partial_path = output_pptx + ".partial"
+        self.prs = prs
+        self.every = every
+        self.recorded = 0
+        self.failed = 0
+        self.source = self._source_id(pdf_path)
+        self.completed = self._load()
         
-        # Try to create a visual representation
-        print("  [1/2] Creating slide visual representation...")
-        slide_image = render_slide_as_image(prs, idx)
+        self.manifest = open(self.manifest_path, "a", encoding="utf-8")
+        if not self.completed:
+            self.manifest.truncate(0)
+            self.manifest.write(json.dumps({"source": self.source}) + "\n")
+            self.manifest.flush()
+    
+    @staticmethod
+    def _source_id(pdf_path):
+        """Fingerprint the PDF's contents so a stale manifest is not reused."""
+        digest = hashlib.sha256()
+        with open(pdf_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def _load(self):
+        """Read {page_idx: notes} from an existing manifest for the same PDF."""
+        completed = {}
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                header = json.loads(f.readline() or "{}")
+                if header.get("source") != self.source:
+                    return {}
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        completed[entry["page"]] = entry["notes"]
+                    except (ValueError, KeyError):
+                        # A crash can leave a half-written last line
+                        continue
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"Warning: Could not read checkpoint {self.manifest_path}: {e}")
+            return {}
+        return completed
+    
+    def record(self, page_idx, notes):
+        """Append a page's notes to the manifest and save a partial PPTX every few pages."""
+        if notes == FAILED_NOTES:
+            self.failed += 1
+        elif page_idx not in self.completed:
+            self.manifest.write(json.dumps({"page": page_idx, "notes": notes}) + "\n")
+            self.manifest.flush()
         
-        # Strategy: Use image if available for better context, otherwise use text
-        if slide_image:
+        self.recorded += 1
+        if self.every > 0 and self.recorded % self.every == 0:
             try:
-                print(f"  [2/2] Generating speaker notes with AI (visual analysis with {len(combined_text)} chars of text)...")
-                notes = generate_speaker_notes(slide_image, api_key)
+                _save_presentation(self.prs, self.partial_path)
+                print(f"  ✓ Checkpoint saved after {self.recorded} slides: {self.partial_path}")
             except Exception as e:
-                print(f"  Warning: Image-based analysis failed: {str(e)[:100]}")
-                notes = None
+                print(f"  Warning: Could not save checkpoint: {str(e)[:100]}")
+    
+    def finish(self):
+        """Remove the manifest and partial PPTX once the real output has been saved."""
+        self.manifest.close()
+        for path in (self.manifest_path, self.partial_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+# Set while _save_presentation() saves on this thread, see _store_media_uncompressed()
+_save_state = threading.local()
+_zip_writer_lock = threading.Lock()
+
+
+def _store_media_uncompressed():
+    """
+    Make python-pptx store images without deflating them in _save_presentation().
+    
+    Slide images are already JPEG/PNG, so DEFLATE spends CPU on every save
+    (checkpoints included) for almost no size gain. XML parts are still
+    compressed. python-pptx's zip writer is wrapped on the first save; the
+    wrapper only stores media while _save_presentation() is saving on the
+    same thread, so any other python-pptx user in the process keeps the
+    stock behaviour. Does nothing if the writer isn't where we expect.
+    """
+    try:
+        from pptx.opc.serialized import _ZipPkgWriter
+    except ImportError:
+        return
+    
+    with _zip_writer_lock:
+        original_write = _ZipPkgWriter.write
+        if getattr(original_write, "stores_media", False):
+            return
         
-        # Fallback to text-only approach if image analysis failed or no image
-        if notes is None and combined_text:
-            print(f"  [2/2] Generating speaker notes with AI (text-based, {len(combined_text)} chars)...")
+        def write(self, pack_uri, blob):
+            if not getattr(_save_state, "store_media", False) or not pack_uri.startswith("/ppt/media/"):
+                return original_write(self, pack_uri, blob)
             try:
-                notes = generate_notes_from_text(combined_text, api_key)
-            except Exception as e:
-                print(f"  Error generating notes: {str(e)[:100]}")
-                notes = "This slide contains content but speaker notes could not be generated. Please review and add custom notes."
+                zipf = self._zipf
+            except AttributeError:
+                return original_write(self, pack_uri, blob)
+            zipf.writestr(pack_uri.membername, blob, compress_type=zipfile.ZIP_STORED)
         
-        # If we still don't have notes, provide a default message
-        if notes is None:
-            print("  Warning: No content found in slide")
-            notes = "This slide appears to be empty or contains only visual elements without text. Please review and add custom speaker notes as needed."
-        
-        # Add notes to slide
-        try:
-            notes_slide = slide.notes_slide
-            text_frame = notes_slide.notes_text_frame
-            text_frame.text = notes
-            
-            print(f"  ✓ Slide {idx + 1} completed with notes")
-            print(f"  Notes preview: {notes[:100]}...\n")
-        except Exception as e:
-            print(f"  Error adding notes to slide: {str(e)[:100]}\n")
+        write.stores_media = True
+        _ZipPkgWriter.write = write
+
+
+def _save_with_media_stored(prs, target):
+    """Save prs into target (path or file object) with media stored uncompressed."""
+    _store_media_uncompressed()
+    _save_state.store_media = True
+    try:
+        prs.save(target)
+    finally:
+        _save_state.store_media = False
+
+
+def _save_presentation(prs, path):
+    """
+    Save a presentation with one write, replacing any existing file atomically.
     
-    # Save presentation
-    print(f"{'='*60}")
-    print(f"Saving presentation: {output_pptx}")
-    prs.save(output_pptx)
-    print("✓ Conversion completed successfully!")
-    print("✓ Each slide has AI-generated speaker notes!")
-    print(f"{'='*60}\n")
+    python-pptx writes the zip straight to disk in many small pieces; building
+    it in memory first turns that into a single write, and the rename means
+    a download never sees a half-written file.
     
-    return output_pptx
+    Args:
+        prs: Presentation object
+        path (str): Output PPTX path, or a writable file object to save into
+    """
+    if hasattr(path, "write"):
+        _save_with_media_stored(prs, path)
+        return
+    
+    buffer = io.BytesIO()
+    _save_with_media_stored(prs, buffer)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(buffer.getbuffer())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
 
 
-def generate_notes_from_text(slide_text, api_key, note_style="standard", note_tone="professional"):
+def _add_page_picture(slide, image_bytes, left, top, width, height, image_parts):
     """
-    Generate speaker notes from slide text content.
+    Add a rendered page image to a slide, embedding identical images only once.
+    
+    slide.shapes.add_picture() looks for an existing copy of the image by
+    re-hashing every image already in the package, which is quadratic over
+    a long PDF. The first copy of each image still goes through
+    add_picture(); repeats (dividers, repeated backgrounds) look its image
+    part up in our own SHA1 index, link it with relate_to() and clone that
+    first picture element.
     
     Args:
-        slide_text (str): Text content from slide
-        api_key (str): Google AI API key
-        note_style: Style of notes - 'brief', 'standard', or 'detailed'
-        note_tone: Tone of notes - 'professional', 'casual', 'academic', or 'persuasive'
+        slide: python-pptx Slide
+        image_bytes (bytes): Encoded page image
+        left, top, width, height: Picture position and size (EMU)
+        image_parts (dict): SHA1 -> (image part, picture element) index for this presentation
+    """
+    digest = hashlib.sha1(image_bytes).digest()
+    known = image_parts.get(digest)
+    if known is None:
+        picture = slide.shapes.add_picture(io.BytesIO(image_bytes), left, top, width=width, height=height)
+        rId = picture.element.xpath("./p:blipFill/a:blip/@r:embed")[0]
+        image_parts[digest] = (slide.part.related_part(rId), copy.deepcopy(picture.element))
+        return
+    
+    image_part, template = known
+    pic = copy.deepcopy(template)
+    pic.xpath("./p:blipFill/a:blip")[0].set(qn("r:embed"), slide.part.relate_to(image_part, RT.IMAGE))
+    shape_id = max(int(value) for value in slide.shapes.element.xpath(".//p:cNvPr/@id")) + 1
+    c_nv_pr = pic.xpath("./p:nvPicPr/p:cNvPr")[0]
+    c_nv_pr.set("id", str(shape_id))
+    c_nv_pr.set("name", f"Picture {shape_id - 1}")
+    slide.shapes.element.append(pic)
+    
+    picture = slide.shapes[-1]
+    picture.left, picture.top, picture.width, picture.height = left, top, width, height
+
+
+def _fit_picture(slide_width, slide_height, img_width, img_height):
+    """
+    Fit an image inside the slide, preserving its aspect ratio, and center it.
+    
+    Args:
+        slide_width (int): Slide width in EMU
+        slide_height (int): Slide height in EMU
+        img_width (int): Image width in pixels
+        img_height (int): Image height in pixels
     
     Returns:
-        str: Generated speaker notes
+        tuple: (left, top, width, height) in EMU
     """
-    if not slide_text or not slide_text.strip():
-        return "This slide appears to contain visual content without text. Please review the slide and add appropriate speaker notes."
+    # The image fills whichever dimension runs out first; exact integer EMU math
+    pic_width = min(slide_width, slide_height * img_width // img_height)
+    pic_height = min(slide_height, slide_width * img_height // img_width)
+    return (slide_width - pic_width) // 2, (slide_height - pic_height) // 2, pic_width, pic_height
+
+
+def _report_failed_notes(failed):
+    """
+    Print the closing summary, calling out slides left with the failure placeholder.
     
-    client = genai.Client(api_key=api_key)
-    
-    # Configure style based on selection
-    style_configs = {
-        'brief': {
-            'duration': '20-30 seconds',
-            'detail': 'concise and to the point',
-            'sentences': '2-4 sentences'
-        },
-        'standard': {
-            'duration': '45-60 seconds',
-            'detail': 'clear and comprehensive',
-            'sentences': '4-6 sentences'
-        },
-        'detailed': {
-            'duration': '90-120 seconds',
-            'detail': 'thorough and detailed with context and examples',
-            'sentences': '8-12 sentences'
-        }
-    }
+    Args:
+        failed (int): Number of slides whose notes are FAILED_NOTES
+    """
+    if failed:
+        print(f"Warning: {failed} slides could not get notes after retries; "
+              f"re-run to try them again (finished slides are cached)")
+    else:
+        print("✓ Each slide has AI-generated speaker notes!")
+
+
+def generate_notes_from_text_batch(slide_texts, client_pool, note_style="standard", note_tone="professional"):
+    """
+    Generate notes for several text-only slides with a single Gemini request.
     
-    # Configure tone based on selection
-    tone_configs = {
-        'professional': 'professional and business-appropriate',
-        'casual': 'friendly and conversational',
-        'academic': 'scholarly and research-oriented',
-        'persuasive': 'compelling and convincing',
-        'enthusiastic': 'energetic and passionate',
-        'storytelling': 'narrative-driven and engaging with stories',
-        'technical': 'precise and technically detailed',
-        'inspirational': 'motivational and uplifting',
-        'educational': 'clear and instructive for learning'
-    }
+    Results are cached per slide under the same key generate_notes_from_text()
+    uses. Batches whose prompt has more UTF-8 bytes than GEMINI_MAX_INPUT_TOKENS
+    are not sent (a token covers at least one byte, but a CJK character or
+    emoji can be several tokens), so long slides go through the per-slide
+    truncation path.
+    
+    Args:
+        slide_texts (list): Text content of each slide
+        client_pool (GeminiClientPool): API clients shared across all slides of a job
+        note_style: Style of notes - 'brief', 'standard', or 'detailed'
+        note_tone: Tone of notes - 'professional', 'casual', 'academic', or 'persuasive'
+    
+    Returns:
+        list: Notes per slide, or None where the batch gave no usable answer
+    """
+    model_name = _MODEL_NAME
+    cache_keys = [
+        _notes_cache_key(model_name, _text_notes_prompt(text, note_style, note_tone), text.encode())
+        for text in slide_texts
+    ]
+    results = [_cache_get(key) for key in cache_keys]
+    missing = [i for i, notes in enumerate(results) if notes is None]
+    if not missing:
+        return results
     
-    style_config = style_configs.get(note_style, style_configs['standard'])
-    tone_description = tone_configs.get(note_tone, tone_configs['professional'])
+    numbered = "\n\n".join(f"SLIDE {slide_idx}:\n{slide_texts[i]}" for slide_idx, i in enumerate(missing))
+    prompt = f"{_text_notes_prompt(numbered, note_style, note_tone)}\n\n{_batch_instructions(len(missing))}"
+    if len(missing) < 2 or len(prompt.encode("utf-8")) > GEMINI_MAX_INPUT_TOKENS:
+        return results
     
-    prompt = f"""Based on this slide content, write exactly what the presenter should say when presenting this slide.
+    contents = [types.Part.from_text(text=prompt)]
+    for i, notes in zip(missing, _generate_notes_array(client_pool, model_name, contents, len(missing))):
+        if notes is not None:
+            results[i] = notes
+            _cache_put(cache_keys[i], notes)
+    return results
 
-Slide content:
-{slide_text}
 
-Write a natural, conversational script that:
-- Takes approximately {style_config['duration']} to speak
-- Is {style_config['detail']}
-- Contains {style_config['sentences']}
-- Uses a {tone_description} tone
-- Flows smoothly and sounds natural when spoken aloud
-- Explains the content clearly
-- Is written in first person (as if you are the presenter)
-- Uses simple, clear language
-- Includes no markdown formatting, bullets, or special characters
-- Is just plain text that can be read directly
-- Expands on the bullet points or headings with context and explanation
+@contextlib.contextmanager
+def _notes_executor(concurrency):
+    """
+    Thread pool for a job's Gemini calls that drops queued calls if the job stops early.
+    
+    A plain `with ThreadPoolExecutor()` waits for every submitted call on
+    exit, so a job abandoned mid-way (the web client disconnected and the
+    progress generator was closed, or an error or Ctrl-C) would still spend
+    API quota on a whole chunk of slides nobody will see. On any exception,
+    including GeneratorExit, calls that have not started are cancelled and
+    only those already in flight are waited for.
+    
+    Args:
+        concurrency (int): Maximum number of Gemini requests in flight
+    
+    Yields:
+        ThreadPoolExecutor
+    """
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency))
+    try:
+        yield executor
+    except BaseException:
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    else:
+        executor.shutdown(wait=True)
 
-Write ONLY the spoken words - nothing else. No labels, no sections, no formatting.
-Just write what needs to be said, as if you're speaking directly to the audience."""
 
-    try:
-        model_name = os.environ.get('GEMINI_MODEL', 'gemini-3-flash-preview')
-        response = client.models.generate_content(
-            model=model_name,
-            contents=[
-                types.Part.from_text(text=prompt)
-            ]
-        )
-        
-        notes = response.text.strip()
-        return notes
-        
-    except Exception as e:
-        print(f"    Warning: Failed to generate notes: {e}")
-        return "Speaker notes could not be generated for this slide."
+def _finished_in_order(pending, wait_for_first=False):
+    """
+    Pop entries off the front of a deque of in-flight jobs once their futures are done.
+    
+    Args:
+        pending (deque): Tuples whose third item is a Future, in output order
+        wait_for_first (bool): Block until the oldest entry has finished
+    
+    Yields:
+        tuple: (entry, result) in the order the entries were queued
+    """
+    while pending and (wait_for_first or pending[0][2].done()):
+        entry = pending.popleft()
+        wait_for_first = False
+        yield entry, entry[2].result()
 
 
-def pdf_to_pptx_with_notes(pdf_path, output_pptx=None, dpi=200, api_key=None):
+def pdf_to_pptx_with_notes(pdf_path, output_pptx=None, dpi=DEFAULT_DPI, api_key=None,
+                           concurrency=DEFAULT_CONCURRENCY, lossless=False,
+                           chunk_size=DEFAULT_CHUNK_SIZE):
     """
     Convert PDF to PPTX with each page as an image slide plus AI-generated speaker notes.
     
@@ -494,6 +2273,9 @@ def pdf_to_pptx_with_notes(pdf_path, output_pptx=None, dpi=200, api_key=None):
         output_pptx (str): Path for output PPTX file
         dpi (int): Resolution for PDF rendering
         api_key (str): Google AI API key
+        concurrency (int): Maximum number of Gemini requests in flight
+        lossless (bool): Embed pages as PNG instead of JPEG
+        chunk_size (int): Maximum pages rendered but still waiting for notes
     
     Returns:
         str: Path to created PPTX file
@@ -519,81 +2301,92 @@ def pdf_to_pptx_with_notes(pdf_path, output_pptx=None, dpi=200, api_key=None):
     print(f"DPI: {dpi}")
     print(f"Using Google Gemini for speaker notes generation...\n")
     
-    # Get page count
-    doc = fitz.open(pdf_path)
-    num_pages = len(doc)
-    doc.close()
-    print(f"Total pages: {num_pages}\n")
-    
-    # Create PowerPoint presentation
-    prs = Presentation()
-    
-    # Set slide dimensions (16:9)
-    prs.slide_width = Inches(10)
-    prs.slide_height = Inches(5.625)
-    
-    # Process each page
-    for page_idx in range(num_pages):
-        print(f"{'='*60}")
-        print(f"Processing page {page_idx + 1}/{num_pages}...")
-        print(f"{'='*60}")
+    with fitz.open(pdf_path) as doc:
+        num_pages = len(doc)
+        print(f"Total pages: {num_pages}\n")
+        
+        # Create PowerPoint presentation
+        prs = Presentation()
         
-        # Step 1: Render PDF page as image
-        print("  [1/3] Rendering PDF page...")
-        page_image = render_pdf_page_as_image(pdf_path, page_idx, dpi)
-        img_width, img_height = page_image.size
+        # Set slide dimensions (16:9)
+        prs.slide_width = Inches(10)
+        prs.slide_height = Inches(5.625)
         
-        # Step 2: Add slide with image
-        print("  [2/3] Creating slide...")
+        # Read once: python-pptx resolves these through the XML on every access
+        slide_width, slide_height = prs.slide_width, prs.slide_height
         blank_slide_layout = prs.slide_layouts[6]  # Blank layout
-        slide = prs.slides.add_slide(blank_slide_layout)
+        image_parts = {}  # SHA1 -> embedded page image, see _add_page_picture()
         
-        # Calculate scaling to fit slide
-        slide_aspect = prs.slide_width / prs.slide_height
-        img_aspect = img_width / img_height
+        client_pool = GeminiClientPool(load_api_keys(api_key))
+        futures_by_content = {}  # page JPEG digest -> notes future
+        duplicates = 0
+        pending_slides = deque()
         
-        if img_aspect > slide_aspect:
-            pic_width = prs.slide_width
-            pic_height = int(prs.slide_width * img_height / img_width)
-            left = 0
-            top = int((prs.slide_height - pic_height) / 2)
-        else:
-            pic_height = prs.slide_height
-            pic_width = int(prs.slide_height * img_width / img_height)
-            left = int((prs.slide_width - pic_width) / 2)
-            top = 0
-        
-        # Add image to slide
-        img_bytes = io.BytesIO()
-        page_image.save(img_bytes, format='PNG')
-        img_bytes.seek(0)
-        
-        slide.shapes.add_picture(
-            img_bytes,
-            left,
-            top,
-            width=pic_width,
-            height=pic_height
-        )
+        # Pages finished by an earlier, interrupted run keep their notes
+        checkpoint = NotesCheckpoint(pdf_path, output_pptx, prs)
+        if checkpoint.completed:
+            print(f"Resuming: {len(checkpoint.completed)} pages already have notes from a previous run\n")
         
-        # Step 3: Generate and add speaker notes
-        print("  [3/3] Generating speaker notes with AI...")
-        notes = generate_speaker_notes(page_image, api_key)
+        def attach_notes(entry, notes):
+            page_idx, slide, _ = entry
+            notes_slide = slide.notes_slide
+            text_frame = notes_slide.notes_text_frame
+            text_frame.text = notes
+            
+            print(f"  ✓ Slide {page_idx + 1} completed with notes")
+            print(f"  Notes preview: {notes[:100]}...\n")
+            checkpoint.record(page_idx, notes)
         
-        # Add notes to slide
-        notes_slide = slide.notes_slide
-        text_frame = notes_slide.notes_text_frame
-        text_frame.text = notes
+        # Stream pages through: each one is rendered, placed on its slide and handed
+        # to Gemini, then dropped, so at most chunk_size pages are held in memory
+        with _notes_executor(concurrency) as executor:
+            for page_idx, (image_bytes, img_width, img_height, mime_type, gemini_bytes, _) in enumerate(
+                iter_pdf_pages(doc, dpi, lossless)
+            ):
+                print(f"Creating slide {page_idx + 1}/{num_pages}...")
+                slide = prs.slides.add_slide(blank_slide_layout)
+                
+                # Calculate scaling to fit slide
+                left, top, pic_width, pic_height = _fit_picture(slide_width, slide_height, img_width, img_height)
+                
+                # Embed the rendered bytes as-is: they are stored without re-encoding
+                # (and only once for identical pages), so no temp file is needed
+                _add_page_picture(slide, image_bytes, left, top, pic_width, pic_height, image_parts)
+                
+                # Repeated pages (section dividers, agenda re-shows) share one Gemini call;
+                # only byte-identical renders count, so similar-looking pages never merge
+                content_key = hashlib.blake2b(gemini_bytes, digest_size=16).digest()
+                future = futures_by_content.get(content_key)
+                if page_idx in checkpoint.completed:
+                    future = Future()
+                    future.set_result(checkpoint.completed[page_idx])
+                elif future is None:
+                    future = executor.submit(generate_speaker_notes, gemini_bytes, client_pool)
+                    futures_by_content[content_key] = future
+                else:
+                    duplicates += 1
+                pending_slides.append((page_idx, slide, future))
+                
+                # Write finished notes as we go; block once a full chunk is outstanding
+                for entry, notes in _finished_in_order(pending_slides,
+                                                       wait_for_first=len(pending_slides) >= chunk_size):
+                    attach_notes(entry, notes)
+            
+            if duplicates:
+                print(f"\n{duplicates} duplicate slides merged")
+            
+            print("\nWaiting for remaining speaker notes...\n")
+            while pending_slides:
+                for entry, notes in _finished_in_order(pending_slides, wait_for_first=True):
+                    attach_notes(entry, notes)
         
-        print(f"  ✓ Slide {page_idx + 1} completed with notes")
-        print(f"  Notes preview: {notes[:100]}...\n")
-    
     # Save presentation
     print(f"{'='*60}")
     print(f"Saving presentation: {output_pptx}")
-    prs.save(output_pptx)
+    _save_presentation(prs, output_pptx)
+    checkpoint.finish()
     print("✓ Conversion completed successfully!")
-    print("✓ Each slide has AI-generated speaker notes!")
+    _report_failed_notes(checkpoint.failed)
     print(f"{'='*60}\n")
     
     return output_pptx
@@ -602,19 +2395,33 @@ def pdf_to_pptx_with_notes(pdf_path, output_pptx=None, dpi=200, api_key=None):
 def main():
     """Main function."""
     
-    if len(sys.argv) < 2:
-        print("Usage: python pdf_to_pptx_with_notes.py <pdf_or_pptx_file> [output_pptx] [dpi]")
-        print("\nExample:")
-        print("  python pdf_to_pptx_with_notes.py presentation.pdf")
-        print("  python pdf_to_pptx_with_notes.py presentation.pptx output.pptx")
-        print("  python pdf_to_pptx_with_notes.py presentation.pdf output.pptx 200")
-        print("\nSupports both PDF and PPTX input files.")
-        print("Requires GOOGLE_API_KEY in .env file.")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description="Add AI-generated speaker notes to a PDF or PPTX presentation.",
+        epilog="Supports both PDF and PPTX input files. Requires GOOGLE_API_KEY in .env file."
+    )
+    parser.add_argument("input_file", help="PDF or PPTX file to process")
+    parser.add_argument("output_file", nargs="?", default=None, help="Output PPTX path")
+    parser.add_argument("dpi", nargs="?", type=int, default=DEFAULT_DPI,
+                        help=f"PDF render resolution (default: {DEFAULT_DPI})")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Maximum concurrent Gemini requests (default: {DEFAULT_CONCURRENCY}, "
+                             "or GEMINI_CONCURRENCY)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"Maximum PDF pages held in memory while waiting for notes "
+                             f"(default: {DEFAULT_CHUNK_SIZE}, or SLIDE_CHUNK)")
+    parser.add_argument("--lossless", action="store_true",
+                        help="Embed PDF pages as PNG instead of JPEG (larger output)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always call Gemini instead of reusing notes cached from earlier runs")
+    args = parser.parse_args()
     
-    input_file = sys.argv[1]
-    output_file = sys.argv[2] if len(sys.argv) > 2 else None
-    dpi = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    if args.no_cache:
+        disable_notes_cache()
+        disable_render_cache()
+    
+    input_file = args.input_file
+    output_file = args.output_file
+    dpi = args.dpi
     
     # Check input file type
     file_ext = Path(input_file).suffix.lower()
@@ -626,7 +2433,8 @@ def main():
     try:
         if file_ext == '.pdf':
             # Process PDF
-            result = pdf_to_pptx_with_notes(input_file, output_file, dpi)
+            result = pdf_to_pptx_with_notes(input_file, output_file, dpi, concurrency=args.concurrency,
+                                            lossless=args.lossless, chunk_size=args.chunk_size)
         elif file_ext == '.pptx':
             # Process PPTX
             if output_file is None:
@@ -637,7 +2445,7 @@ def main():
             if not api_key:
                 raise ValueError("Google API key required. Set GOOGLE_API_KEY in .env file.")
             
-            result = add_notes_to_pptx(input_file, output_file, api_key)
+            result = add_notes_to_pptx(input_file, output_file, api_key, concurrency=args.concurrency)
         else:
             print(f"✗ Error: Unsupported file format: {file_ext}")
             print("  Supported formats: .pdf, .pptx")
@@ -655,20 +2463,30 @@ if __name__ == "__main__":
     main()
 
 
-def process_pptx_with_progress(input_pptx, output_pptx, api_key, note_style="standard", note_tone="professional"):
+def process_pptx_with_progress(input_pptx, output_pptx, api_key, note_style="standard", note_tone="professional",
+                               concurrency=DEFAULT_CONCURRENCY):
     """
     Process PPTX with progress tracking for streaming updates.
     Yields progress dictionaries during processing.
     
+    Slides are extracted and rendered in order on the calling thread while
+    their Gemini calls run concurrently in the background; "Completed"
+    events are still reported in slide order. Only the "Processing" event
+    carries the slide preview; "Completed" just advances the progress.
+    
     Args:
         input_pptx: Input PowerPoint file path
-        output_pptx: Output PowerPoint file path
+        output_pptx: Output PowerPoint file path, or a writable file object
         api_key: Google AI API key
         note_style: Style of notes - 'brief', 'standard', or 'detailed'
         note_tone: Tone of notes - 'professional', 'casual', 'academic', or 'persuasive'
+        concurrency (int): Maximum number of Gemini requests in flight
     """
     prs = Presentation(input_pptx)
     num_slides = len(prs.slides)
+    client_pool = GeminiClientPool(load_api_keys(api_key))
+    if _render_cache_enabled:
+        prune_render_cache()
     
     yield {
         "status": "started",
@@ -676,76 +2494,8 @@ def process_pptx_with_progress(input_pptx, output_pptx, api_key, note_style="sta
         "message": f"Starting to process {num_slides} slides..."
     }
     
-    for idx, slide in enumerate(prs.slides):
-        current_slide = idx + 1
-        
-        # Extract text content
-        slide_text = []
-        try:
-            for shape in slide.shapes:
-                if hasattr(shape, "text"):
-                    text = shape.text.strip()
-                    if text:
-                        slide_text.append(text)
-                if hasattr(shape, "has_table") and shape.has_table:
-                    for row in shape.table.rows:
-                        for cell in row.cells:
-                            text = cell.text.strip()
-                            if text:
-                                slide_text.append(text)
-        except Exception:
-            pass
-        
-        combined_text = "\n".join(slide_text)
-        
-        # Try visual representation
-        slide_image = render_slide_as_image(prs, idx)
-        
-        # Convert image to base64 for sending to UI
-        slide_image_base64 = None
-        if slide_image:
-            try:
-                # Resize image to reasonable size for web display (max 800px width)
-                display_image = slide_image.copy()
-                max_width = 800
-                if display_image.width > max_width:
-                    ratio = max_width / display_image.width
-                    new_height = int(display_image.height * ratio)
-                    display_image = display_image.resize((max_width, new_height), Image.LANCZOS)
-                
-                # Convert to base64
-                img_buffer = io.BytesIO()
-                display_image.save(img_buffer, format='PNG')
-                img_buffer.seek(0)
-                slide_image_base64 = base64.b64encode(img_buffer.getvalue()).decode('utf-8')
-            except Exception:
-                pass
-        
-        yield {
-            "status": "processing",
-            "current_slide": current_slide,
-            "total_slides": num_slides,
-            "message": f"Processing slide {current_slide} of {num_slides}...",
-            "slide_image": slide_image_base64
-        }
-        
-        notes = None
-        
-        if slide_image:
-            try:
-                notes = generate_speaker_notes(slide_image, api_key, note_style, note_tone)
-            except Exception:
-                notes = None
-        
-        # Fallback to text-only
-        if notes is None and combined_text:
-            try:
-                notes = generate_notes_from_text(combined_text, api_key, note_style, note_tone)
-            except Exception:
-                notes = "This slide contains content but speaker notes could not be generated."
-        
-        if notes is None:
-            notes = "This slide appears to be empty or contains only visual elements without text."
+    def completed_event(entry, notes):
+        idx, slide, _ = entry
         
         # Add notes to slide
         try:
@@ -755,16 +2505,78 @@ def process_pptx_with_progress(input_pptx, output_pptx, api_key, note_style="sta
         except Exception:
             pass
         
-        yield {
+        return {
             "status": "processing",
-            "current_slide": current_slide,
+            "current_slide": idx + 1,
+            "completed_slides": idx + 1,
             "total_slides": num_slides,
-            "message": f"Completed slide {current_slide} of {num_slides}",
-            "slide_image": slide_image_base64
+            "message": f"Completed slide {idx + 1} of {num_slides}"
         }
     
+    pending = deque()
+    futures_by_content = {}  # slide JPEG digest or slide text -> notes future
+    with _notes_executor(concurrency) as executor:
+        for idx, slide in enumerate(prs.slides):
+            current_slide = idx + 1
+            
+            # Extract text content and try a visual representation in one pass
+            slide_image, combined_text = render_slide_with_text(prs, idx)
+            
+            # Downscale the render once; the Gemini JPEG and the UI thumbnail
+            # are both made from that in-memory copy
+            encoded_image = None
+            slide_image_base64 = None
+            if slide_image:
+                try:
+                    gemini_image = _fit_within(slide_image, GEMINI_MAX_PX, Image.LANCZOS)
+                    encoded_image = encode_image(gemini_image)
+                    slide_image_base64 = _preview_base64(gemini_image, encoded_image[0])
+                except Exception:
+                    pass
+            
+            yield {
+                "status": "processing",
+                "current_slide": current_slide,
+                # Earlier slides are either finished or still pending
+                "completed_slides": idx - len(pending),
+                "total_slides": num_slides,
+                "message": f"Processing slide {current_slide} of {num_slides}...",
+                "slide_image": slide_image_base64,
+                "slide_image_mime": "image/jpeg"
+            }
+            
+            # Gemini runs in the background; python-pptx is only touched on this thread
+            trivial_notes = _trivial_slide_notes(slide, combined_text)
+            if trivial_notes is not None:
+                future = Future()
+                future.set_result(trivial_notes)
+            elif not _has_picture(slide):
+                # The render is only for the preview; the text says the same thing
+                future = futures_by_content.get(combined_text)
+                if future is None:
+                    future = executor.submit(_notes_for_slide, current_slide, None, combined_text,
+                                             client_pool, note_style, note_tone)
+                    futures_by_content[combined_text] = future
+            else:
+                # Identical slides share one Gemini call
+                content_key = encoded_image and hashlib.blake2b(encoded_image[0], digest_size=16).digest()
+                future = futures_by_content.get(content_key) if content_key else None
+                if future is None:
+                    future = executor.submit(_notes_for_slide, current_slide, slide_image, combined_text,
+                                             client_pool, note_style, note_tone, encoded_image)
+                    if content_key:
+                        futures_by_content[content_key] = future
+            pending.append((idx, slide, future))
+            
+            for entry, notes in _finished_in_order(pending):
+                yield completed_event(entry, notes)
+        
+        while pending:
+            for entry, notes in _finished_in_order(pending, wait_for_first=True):
+                yield completed_event(entry, notes)
+    
     # Save presentation
-    prs.save(output_pptx)
+    _save_presentation(prs, output_pptx)
     
     yield {
         "status": "saving",
@@ -772,111 +2584,114 @@ def process_pptx_with_progress(input_pptx, output_pptx, api_key, note_style="sta
     }
 
 
-def process_pdf_with_progress(pdf_path, output_pptx, dpi, api_key, note_style="standard", note_tone="professional"):
+def process_pdf_with_progress(pdf_path, output_pptx, dpi, api_key, note_style="standard", note_tone="professional",
+                              concurrency=DEFAULT_CONCURRENCY, chunk_size=DEFAULT_CHUNK_SIZE, lossless=False):
     """
     Process PDF with progress tracking for streaming updates.
     Yields progress dictionaries during processing.
     
+    Pages are rendered in order while their Gemini calls run concurrently;
+    "Completed" events are reported in page order.
+    
     Args:
         pdf_path: Input PDF file path
-        output_pptx: Output PowerPoint file path
+        output_pptx: Output PowerPoint file path, or a writable file object
         dpi: DPI for rendering
         api_key: Google AI API key
         note_style: Style of notes - 'brief', 'standard', or 'detailed'
         note_tone: Tone of notes - 'professional', 'casual', 'academic', or 'persuasive'
+        concurrency (int): Maximum number of Gemini requests in flight
+        chunk_size (int): Maximum pages rendered but still waiting for notes
+        lossless (bool): Embed pages as PNG instead of JPEG
     """
-    doc = fitz.open(pdf_path)
-    num_pages = len(doc)
-    doc.close()
-    
-    yield {
-        "status": "started",
-        "total_slides": num_pages,
-        "message": f"Starting to convert {num_pages} pages..."
-    }
-    
-    prs = Presentation()
-    prs.slide_width = Inches(10)
-    prs.slide_height = Inches(5.625)
-    
-    for page_idx in range(num_pages):
-        current_page = page_idx + 1
-        
-        # Render page
-        page_image = render_pdf_page_as_image(pdf_path, page_idx, dpi)
-        img_width, img_height = page_image.size
-        
-        # Convert image to base64 for sending to UI
-        slide_image_base64 = None
-        try:
-            # Resize image to reasonable size for web display (max 800px width)
-            display_image = page_image.copy()
-            max_width = 800
-            if display_image.width > max_width:
-                ratio = max_width / display_image.width
-                new_height = int(display_image.height * ratio)
-                display_image = display_image.resize((max_width, new_height), Image.LANCZOS)
-            
-            # Convert to base64
-            img_buffer = io.BytesIO()
-            display_image.save(img_buffer, format='PNG')
-            img_buffer.seek(0)
-            slide_image_base64 = base64.b64encode(img_buffer.getvalue()).decode('utf-8')
-        except Exception:
-            pass
+    with fitz.open(pdf_path) as doc:
+        num_pages = len(doc)
+        client_pool = GeminiClientPool(load_api_keys(api_key))
         
         yield {
-            "status": "processing",
-            "current_slide": current_page,
+            "status": "started",
             "total_slides": num_pages,
-            "message": f"Processing page {current_page} of {num_pages}...",
-            "slide_image": slide_image_base64
+            "message": f"Starting to convert {num_pages} pages..."
         }
         
-        # Add slide
-        blank_slide_layout = prs.slide_layouts[6]
-        slide = prs.slides.add_slide(blank_slide_layout)
+        prs = Presentation()
+        prs.slide_width = Inches(10)
+        prs.slide_height = Inches(5.625)
         
-        # Calculate scaling
-        slide_aspect = prs.slide_width / prs.slide_height
-        img_aspect = img_width / img_height
-        
-        if img_aspect > slide_aspect:
-            pic_width = prs.slide_width
-            pic_height = int(prs.slide_width * img_height / img_width)
-            left = 0
-            top = int((prs.slide_height - pic_height) / 2)
-        else:
-            pic_height = prs.slide_height
-            pic_width = int(prs.slide_height * img_width / img_height)
-            left = int((prs.slide_width - pic_width) / 2)
-            top = 0
-        
-        # Add image
-        img_bytes = io.BytesIO()
-        page_image.save(img_bytes, format='PNG')
-        img_bytes.seek(0)
-        
-        slide.shapes.add_picture(img_bytes, left, top, width=pic_width, height=pic_height)
+        # Read once: python-pptx resolves these through the XML on every access
+        slide_width, slide_height = prs.slide_width, prs.slide_height
+        blank_slide_layout = prs.slide_layouts[6]  # Blank layout
+        image_parts = {}  # SHA1 -> embedded page image, see _add_page_picture()
         
-        # Generate notes
-        notes = generate_speaker_notes(page_image, api_key, note_style, note_tone)
+        def completed_event(entry, notes):
+            page_idx, slide, _ = entry
+            
+            # Add notes
+            notes_slide = slide.notes_slide
+            text_frame = notes_slide.notes_text_frame
+            text_frame.text = notes
+            
+            return {
+                "status": "processing",
+                "current_slide": page_idx + 1,
+                "completed_slides": page_idx + 1,
+                "total_slides": num_pages,
+                # The preview was already sent with the "Processing" event
+                "message": f"Completed page {page_idx + 1} of {num_pages}"
+            }
         
-        # Add notes
-        notes_slide = slide.notes_slide
-        text_frame = notes_slide.notes_text_frame
-        text_frame.text = notes
+        pending = deque()
+        with _notes_executor(concurrency) as executor:
+            futures_by_content = {}
+            
+            # Pages are rasterized ahead in worker processes while this thread builds slides
+            for page_idx, (image_bytes, img_width, img_height, mime_type, gemini_bytes, preview_bytes) in enumerate(
+                iter_pdf_pages(doc, dpi, lossless, preview_max_px=PREVIEW_MAX_PX)
+            ):
+                current_page = page_idx + 1
+                
+                # Each page is rendered and encoded once; the thumbnail for the UI
+                # comes ready-made from the render worker
+                slide_image_base64 = base64.b64encode(preview_bytes).decode('utf-8')
+                
+                # Generate notes from the downscaled copy in the background; identical
+                # pages (dividers, repeated agenda) share one Gemini call
+                content_key = hashlib.blake2b(gemini_bytes, digest_size=16).digest()
+                future = futures_by_content.get(content_key)
+                if future is None:
+                    future = executor.submit(generate_speaker_notes, gemini_bytes, client_pool, note_style, note_tone)
+                    futures_by_content[content_key] = future
+                
+                yield {
+                    "status": "processing",
+                    "current_slide": current_page,
+                    "completed_slides": page_idx - len(pending),
+                    "total_slides": num_pages,
+                    "message": f"Processing page {current_page} of {num_pages}...",
+                    "slide_image": slide_image_base64,
+                    "slide_image_mime": "image/jpeg"
+                }
+                
+                # Add slide
+                slide = prs.slides.add_slide(blank_slide_layout)
+                
+                # Calculate scaling to fit slide
+                left, top, pic_width, pic_height = _fit_picture(slide_width, slide_height, img_width, img_height)
+                
+                # Add image (embedded as rendered, see pdf_to_pptx_with_notes)
+                _add_page_picture(slide, image_bytes, left, top, pic_width, pic_height, image_parts)
+                pending.append((page_idx, slide, future))
+                
+                # Report finished pages as we go; block once a full chunk is outstanding
+                for entry, notes in _finished_in_order(pending, wait_for_first=len(pending) >= chunk_size):
+                    yield completed_event(entry, notes)
+            
+            while pending:
+                for entry, notes in _finished_in_order(pending, wait_for_first=True):
+                    yield completed_event(entry, notes)
         
-        yield {
-            "status": "processing",
-            "current_slide": current_page,
-            "total_slides": num_pages,
-            "message": f"Completed page {current_page} of {num_pages}",
-            "slide_image": slide_image_base64
-        }
-    
     # Save
-    prs.save(output_pptx)
+    _save_presentation(prs, output_pptx)
     
     yield {
         "status": "saving",
@@ -4,17 +4,30 @@ Upload PDF or PPTX files and download them with AI-generated speaker notes.
 """
 
 from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse
+from fastapi.responses import FileResponse, HTMLResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 import os
+import io
 import shutil
 from pathlib import Path
+from urllib.parse import quote
 import uuid
 import asyncio
 import json
-from add_speaker_notes import pdf_to_pptx_with_notes, add_notes_to_pptx
+import functools
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from add_speaker_notes import (pdf_to_pptx_with_notes, add_notes_to_pptx, DEFAULT_DPI, GeminiClientPool, load_api_keys,
+                               prune_render_cache)
 from dotenv import load_dotenv
 
+# orjson serializes the large base64 previews far faster than json, when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Load environment variables
 load_dotenv()
 
@@ -26,15 +39,128 @@ OUTPUT_DIR = Path("outputs")
 UPLOAD_DIR.mkdir(exist_ok=True)
 OUTPUT_DIR.mkdir(exist_ok=True)
 
-# Store mapping of processing_id to original filename
+# Read size used when copying uploads to disk
+UPLOAD_COPY_CHUNK = 1024 * 1024
+
+# Uploads processed at the same time; each one renders and calls Gemini in parallel itself
+MAX_CONCURRENT_JOBS = int(os.environ.get("MAX_CONCURRENT_JOBS", "2"))
+job_slots = asyncio.Semaphore(max(1, MAX_CONCURRENT_JOBS))
+
+# Seconds uploads and outputs are kept; older ones are swept by cleanup_loop()
+FILE_TTL_SECONDS = int(os.environ.get("FILE_TTL_SECONDS", "3600"))
+
+# Store mapping of processing_id to (original filename, upload time)
 filename_mapping = {}
 
+# Finished decks up to this size are kept in memory for /download instead of on disk
+OUTPUT_MEMORY_LIMIT = int(os.environ.get("OUTPUT_MEMORY_LIMIT_MB", "50")) * 1024 * 1024
+
+# Total size of the decks kept in memory; beyond it the least recently used go to disk
+OUTPUT_CACHE_LIMIT = int(os.environ.get("OUTPUT_CACHE_LIMIT_MB", "200")) * 1024 * 1024
+
+# Output filename -> (PPTX bytes, time finished), least recently used first.
+# Only touched on the event loop thread.
+output_cache = OrderedDict()
+
+
+def prune_filename_mapping():
+    """Drop mappings for uploads that were never processed within FILE_TTL_SECONDS."""
+    cutoff = time.time() - FILE_TTL_SECONDS
+    for processing_id in [pid for pid, (_, created) in filename_mapping.items() if created < cutoff]:
+        del filename_mapping[processing_id]
+
+
+def prune_output_cache():
+    """Drop in-memory outputs that were not downloaded within FILE_TTL_SECONDS."""
+    cutoff = time.time() - FILE_TTL_SECONDS
+    for filename in [name for name, (_, created) in output_cache.items() if created < cutoff]:
+        del output_cache[filename]
+
+
+def cache_output(filename, data):
+    """
+    Keep a finished deck in memory for /download.
+    
+    Returns the (filename, PPTX bytes) of the least recently used decks that
+    no longer fit in OUTPUT_CACHE_LIMIT. They stay cached until the caller
+    has written them to disk with write_outputs() and called evict_outputs().
+    """
+    output_cache[filename] = (data, time.time())
+    output_cache.move_to_end(filename)
+    
+    excess = sum(len(cached) for cached, _ in output_cache.values()) - OUTPUT_CACHE_LIMIT
+    spilled = []
+    for name, (cached, _) in output_cache.items():
+        if excess <= 0:
+            break
+        spilled.append((name, cached))
+        excess -= len(cached)
+    return spilled
+
+
+def write_outputs(outputs):
+    """Write (filename, PPTX bytes) pairs to OUTPUT_DIR (blocking)."""
+    for filename, data in outputs:
+        with open(OUTPUT_DIR / filename, "wb") as f:
+            f.write(data)
+
+
+def evict_outputs(outputs):
+    """Drop decks written to disk by write_outputs() from memory, unless they were replaced meanwhile."""
+    for filename, data in outputs:
+        cached = output_cache.get(filename)
+        if cached is not None and cached[0] is data:
+            del output_cache[filename]
+
+
+def remove_stale_files():
+    """Delete uploads, outputs and slide renders older than FILE_TTL_SECONDS (blocking)."""
+    cutoff = time.time() - FILE_TTL_SECONDS
+    for directory in (UPLOAD_DIR, OUTPUT_DIR):
+        for path in directory.iterdir():
+            try:
+                if path.is_file() and path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError:
+                pass
+    # Rendered slides of uploaded decks should not outlive the decks themselves
+    prune_render_cache(max_age=FILE_TTL_SECONDS)
+
+
+async def cleanup_loop():
+    """Periodically drop abandoned uploads, outputs, slide renders and filename mappings."""
+    while True:
+        await asyncio.sleep(max(60, FILE_TTL_SECONDS // 6))
+        prune_filename_mapping()
+        prune_output_cache()
+        await asyncio.to_thread(remove_stale_files)
+
+
+def sse_event(data):
+    """Format a progress dict as one Server-Sent Events message."""
+    if orjson is not None:
+        return b"data: " + orjson.dumps(data) + b"\n\n"
+    return f"data: {json.dumps(data)}\n\n"
+
+
+def save_upload(source, destination):
+    """Copy an uploaded file's spooled contents to disk (blocking)."""
+    source.seek(0)
+    with open(destination, "wb") as buffer:
+        shutil.copyfileobj(source, buffer, length=UPLOAD_COPY_CHUNK)
+
 
 @app.get("/", response_class=HTMLResponse)
 async def home():
     """Serve the main HTML page."""
+    return HTMLResponse(content=load_index_html())
+
+
+@functools.lru_cache(maxsize=1)
+def load_index_html():
+    """Read index.html once per process; restart the server to pick up edits."""
     with open("index.html", "r", encoding="utf-8") as f:
-        return HTMLResponse(content=f.read())
+        return f.read()
 
 
 @app.post("/upload")
@@ -56,10 +182,9 @@ async def upload_file(file: UploadFile = File(...)):
     input_filename = f"{unique_id}{file_ext}"
     input_path = UPLOAD_DIR / input_filename
     
-    # Save uploaded file
+    # Save uploaded file off the event loop, in 1 MB chunks
     try:
-        with open(input_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        await asyncio.to_thread(save_upload, file.file, input_path)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
     
@@ -68,7 +193,8 @@ async def upload_file(file: UploadFile = File(...)):
     output_filename = f"{original_stem}_with_notes.pptx"
     
     # Store the mapping for later retrieval
-    filename_mapping[unique_id] = output_filename
+    prune_filename_mapping()
+    filename_mapping[unique_id] = (output_filename, time.time())
     
     # Return the processing ID for SSE endpoint
     return {
@@ -80,7 +206,8 @@ async def upload_file(file: UploadFile = File(...)):
 
 
 @app.get("/process/{processing_id}")
-async def process_file(processing_id: str, style: str = "standard", tone: str = "professional"):
+async def process_file(processing_id: str, style: str = "standard", tone: str = "professional",
+                       lossless: bool = False, dpi: int = DEFAULT_DPI):
     """Stream processing progress using Server-Sent Events."""
     
     async def event_generator():
@@ -88,15 +215,16 @@ async def process_file(processing_id: str, style: str = "standard", tone: str =
             # Find the input file
             input_files = list(UPLOAD_DIR.glob(f"{processing_id}.*"))
             if not input_files:
-                yield f"data: {json.dumps({'error': 'File not found'})}\n\n"
+                yield sse_event({'error': 'File not found'})
                 return
             
             input_path = input_files[0]
             file_ext = input_path.suffix.lower()
             
             # Get original filename from mapping, fallback to UUID if not found
-            output_filename = filename_mapping.get(processing_id, f"{processing_id}_with_notes.pptx")
+            output_filename = filename_mapping.get(processing_id, (f"{processing_id}_with_notes.pptx",))[0]
             output_path = OUTPUT_DIR / output_filename
+            output_buffer = io.BytesIO()
             
             # Get API key
             api_key = os.environ.get('GOOGLE_API_KEY')
@@ -106,19 +234,26 @@ async def process_file(processing_id: str, style: str = "standard", tone: str =
                 if file_ext == '.pdf':
                     # Process PDF
                     async for progress in pdf_to_pptx_with_notes_streaming(
-                        str(input_path), str(output_path), dpi=200, api_key=api_key,
-                        note_style=style, note_tone=tone
+                        str(input_path), output_buffer, dpi=min(max(dpi, 72), 300), api_key=api_key,
+                        note_style=style, note_tone=tone, lossless=lossless
                     ):
-                        yield f"data: {json.dumps(progress)}\n\n"
-                        await asyncio.sleep(0.1)  # Small delay for streaming
+                        yield sse_event(progress)
                 else:
                     # Process PPTX
                     async for progress in add_notes_to_pptx_streaming(
-                        str(input_path), str(output_path), api_key,
+                        str(input_path), output_buffer, api_key,
                         note_style=style, note_tone=tone
                     ):
-                        yield f"data: {json.dumps(progress)}\n\n"
-                        await asyncio.sleep(0.1)
+                        yield sse_event(progress)
+                
+                # The deck was saved into memory; keep it there or spill it to disk
+                if output_buffer.getbuffer().nbytes <= OUTPUT_MEMORY_LIMIT:
+                    spilled = cache_output(output_path.name, output_buffer.getvalue())
+                else:
+                    output_cache.pop(output_path.name, None)
+                    spilled = [(output_path.name, output_buffer.getbuffer())]
+                await asyncio.to_thread(write_outputs, spilled)
+                evict_outputs(spilled)
                 
                 # Clean up input file
                 if input_path.exists():
@@ -129,7 +264,7 @@ async def process_file(processing_id: str, style: str = "standard", tone: str =
                     del filename_mapping[processing_id]
                 
                 # Send completion
-                yield f"data: {json.dumps({'status': 'complete', 'filename': output_path.name})}\n\n"
+                yield sse_event({'status': 'complete', 'filename': output_path.name})
                 
             except Exception as e:
                 # Clean up on error
@@ -140,36 +275,104 @@ async def process_file(processing_id: str, style: str = "standard", tone: str =
                 # Clean up the filename mapping
                 if processing_id in filename_mapping:
                     del filename_mapping[processing_id]
-                yield f"data: {json.dumps({'error': str(e)})}\n\n"
+                yield sse_event({'error': str(e)})
         
         except Exception as e:
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            yield sse_event({'error': str(e)})
     
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
 
-async def pdf_to_pptx_with_notes_streaming(pdf_path, output_pptx, dpi, api_key, note_style="standard", note_tone="professional"):
+async def finish_in_thread(generator, step, worker):
+    """
+    Close a progress generator once its in-flight step has returned.
+    
+    A disconnecting client cancels the request while next() may still be
+    running; closing the generator then would raise "generator already
+    executing" and leave it to be closed by GC on the event loop. Waiting
+    for the step first, then closing on the job's own worker thread, keeps
+    the executor shutdown and in-flight Gemini calls off the loop.
+    
+    The job's slot in job_slots is only released here, after the work has
+    really stopped, so a cancelled job keeps counting towards
+    MAX_CONCURRENT_JOBS until then.
+    """
+    try:
+        if step is not None:
+            await asyncio.wait([step])
+        await asyncio.get_running_loop().run_in_executor(worker, generator.close)
+    finally:
+        worker.shutdown(wait=False)
+        job_slots.release()
+
+
+async def iterate_in_thread(generator):
+    """
+    Drive a blocking progress generator from a worker thread.
+    
+    Rendering, Gemini calls and prs.save() all run inside the generator;
+    stepping it on a dedicated thread keeps the event loop free to serve
+    other requests (and other uploads' event streams) meanwhile.
+    
+    At most MAX_CONCURRENT_JOBS generators run at once, so simultaneous
+    uploads don't each start a full set of render processes and Gemini
+    workers; the rest report "queued" until a slot frees up.
+    """
+    if job_slots.locked():
+        yield {"status": "queued", "message": "Waiting for other uploads to finish..."}
+    
+    done = object()
+    loop = asyncio.get_running_loop()
+    step = None
+    await job_slots.acquire()
+    worker = ThreadPoolExecutor(max_workers=1)
+    try:
+        while True:
+            # Shielded so a disconnect leaves the step's future to wait on below
+            step = loop.run_in_executor(worker, next, generator, done)
+            progress = await asyncio.shield(step)
+            if progress is done:
+                break
+            yield progress
+    finally:
+        # finish_in_thread() frees the slot; it runs to completion even if this is cancelled again
+        await asyncio.shield(finish_in_thread(generator, step, worker))
+
+
+async def pdf_to_pptx_with_notes_streaming(pdf_path, output_pptx, dpi, api_key, note_style="standard", note_tone="professional",
+                                           lossless=False):
     """Process PDF with progress streaming."""
     from add_speaker_notes import process_pdf_with_progress
     
-    for progress in process_pdf_with_progress(pdf_path, output_pptx, dpi, api_key, note_style, note_tone):
+    async for progress in iterate_in_thread(
+        process_pdf_with_progress(pdf_path, output_pptx, dpi, api_key, note_style, note_tone, lossless=lossless)
+    ):
         yield progress
-        await asyncio.sleep(0)
 
 
 async def add_notes_to_pptx_streaming(input_pptx, output_pptx, api_key, note_style="standard", note_tone="professional"):
     """Process PPTX with progress streaming."""
     from add_speaker_notes import process_pptx_with_progress
     
-    for progress in process_pptx_with_progress(input_pptx, output_pptx, api_key, note_style, note_tone):
+    async for progress in iterate_in_thread(
+        process_pptx_with_progress(input_pptx, output_pptx, api_key, note_style, note_tone)
+    ):
         yield progress
-        await asyncio.sleep(0)
 
 
 @app.get("/download/{filename}")
 async def download_file(filename: str):
     """Download the processed file."""
     
+    cached = output_cache.get(filename)
+    if cached is not None:
+        output_cache.move_to_end(filename)
+        return Response(
+            content=cached[0],
+            media_type='application/vnd.openxmlformats-officedocument.presentationml.presentation',
+            headers={"Content-Disposition": f"attachment; filename*=utf-8''{quote(filename)}"}
+        )
+    
     file_path = OUTPUT_DIR / filename
     
     if not file_path.exists():
@@ -192,6 +395,11 @@ async def startup_event():
         print("   Set it in the .env file before using the application.")
     else:
         print("✓ GOOGLE_API_KEY configured")
+        # Build the shared Gemini clients now rather than on the first upload
+        GeminiClientPool(load_api_keys(api_key))
+    
+    # Uploads whose browser tab was closed never reach /process; sweep them
+    app.state.cleanup_task = asyncio.create_task(cleanup_loop())
     
     print("\n" + "="*60)
     print("🎤 Speaker Notes Generator Server")
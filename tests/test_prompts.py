@@ -0,0 +1,48 @@
+"""
+Tests for Gemini prompt budgeting in add_speaker_notes.py.
+
+Run with: python -m pytest tests
+"""
+
+import pytest
+
+pytest.importorskip("fitz")
+pytest.importorskip("pptx")
+pytest.importorskip("google.genai")
+
+import add_speaker_notes
+
+
+@pytest.fixture
+def sent_batches(monkeypatch):
+    """Record batched text requests instead of sending them to Gemini."""
+    sent = []
+    
+    def fake_generate_notes_array(client_pool, model_name, contents, count):
+        sent.append(contents)
+        return [f"notes {i}" for i in range(count)]
+    
+    monkeypatch.setattr(add_speaker_notes, "_cache_enabled", False)
+    monkeypatch.setattr(add_speaker_notes, "GEMINI_MAX_INPUT_TOKENS", 8000)
+    monkeypatch.setattr(add_speaker_notes, "_generate_notes_array", fake_generate_notes_array)
+    return sent
+
+
+def test_text_batch_within_budget_is_sent(sent_batches):
+    results = add_speaker_notes.generate_notes_from_text_batch(["a" * 2000, "b" * 2000], client_pool=None)
+    
+    assert results == ["notes 0", "notes 1"]
+    assert len(sent_batches) == 1
+
+
+def test_text_batch_over_budget_in_bytes_is_not_sent(sent_batches):
+    # Fewer characters than the budget, but three UTF-8 bytes (and possibly
+    # several tokens) per character
+    slide_texts = ["\u6f22" * 2000, "\u5b57" * 2000]
+    prompt_chars = sum(len(text) for text in slide_texts) + 2000
+    assert prompt_chars < add_speaker_notes.GEMINI_MAX_INPUT_TOKENS
+    
+    results = add_speaker_notes.generate_notes_from_text_batch(slide_texts, client_pool=None)
+    
+    assert results == [None, None]
+    assert sent_batches == []
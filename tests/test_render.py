@@ -0,0 +1,53 @@
+"""
+Tests for PDF page rendering in add_speaker_notes.py.
+
+Run with: python -m pytest tests
+"""
+
+import io
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+pytest.importorskip("pptx")
+pytest.importorskip("google.genai")
+Image = pytest.importorskip("PIL.Image")
+
+from add_speaker_notes import DEFAULT_DPI, GEMINI_MAX_PX, PREVIEW_MAX_PX, dpi_matrix, render_page_bytes
+
+
+def make_letter_pdf():
+    """Build a one-page US-letter PDF in memory."""
+    doc = fitz.open()
+    page = doc.new_page(width=612, height=792)
+    page.insert_text((72, 72), "Quarterly results", fontsize=24)
+    return doc
+
+
+def test_default_dpi_page_is_downscaled_for_gemini():
+    with make_letter_pdf() as doc:
+        image_bytes, width, height, mime_type, gemini_bytes, preview_bytes = render_page_bytes(
+            doc, 0, dpi_matrix(DEFAULT_DPI)
+        )
+    
+    # A letter page at the default DPI is larger than what Gemini is sent
+    assert max(width, height) > GEMINI_MAX_PX
+    assert mime_type == 'image/jpeg'
+    assert gemini_bytes is not image_bytes
+    assert gemini_bytes.startswith(b"\xff\xd8")
+    with Image.open(io.BytesIO(gemini_bytes)) as gemini_image:
+        assert max(gemini_image.size) == GEMINI_MAX_PX
+    assert preview_bytes is None
+
+
+def test_default_dpi_page_gets_a_preview_thumbnail():
+    with make_letter_pdf() as doc:
+        *_, gemini_bytes, preview_bytes = render_page_bytes(
+            doc, 0, dpi_matrix(DEFAULT_DPI), preview_max_px=PREVIEW_MAX_PX
+        )
+    
+    # The web UI's thumbnail is smaller than the Gemini copy, so it is scaled again
+    assert PREVIEW_MAX_PX < GEMINI_MAX_PX
+    assert preview_bytes != gemini_bytes
+    with Image.open(io.BytesIO(preview_bytes)) as preview_image:
+        assert max(preview_image.size) == PREVIEW_MAX_PX
@@ -0,0 +1,83 @@
+"""
+Tests for saving presentations in add_speaker_notes.py.
+
+Run with: python -m pytest tests
+"""
+
+import io
+import zipfile
+
+import pytest
+
+pytest.importorskip("fitz")
+pptx = pytest.importorskip("pptx")
+pytest.importorskip("google.genai")
+Image = pytest.importorskip("PIL.Image")
+
+from pptx.util import Inches
+
+from add_speaker_notes import _add_page_picture, _save_presentation
+
+
+def png_bytes(color='red'):
+    """Encode a small solid-colour PNG."""
+    image_buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), color=color).save(image_buffer, format='PNG')
+    return image_buffer.getvalue()
+
+
+def make_picture_deck():
+    """Build a one-slide presentation holding a PNG picture."""
+    image_buffer = io.BytesIO(png_bytes())
+    prs = pptx.Presentation()
+    slide = prs.slides.add_slide(prs.slide_layouts[6])
+    slide.shapes.add_picture(io.BytesIO(image_buffer.getvalue()), Inches(1), Inches(1))
+    return prs
+
+
+def compress_types(pptx_bytes):
+    """Map each zip member of a saved deck to its compression type."""
+    with zipfile.ZipFile(io.BytesIO(pptx_bytes)) as zipf:
+        return {info.filename: info.compress_type for info in zipf.infolist()}
+
+
+def test_save_presentation_stores_media_uncompressed():
+    output = io.BytesIO()
+    _save_presentation(make_picture_deck(), output)
+    
+    types = compress_types(output.getvalue())
+    media = [name for name in types if name.startswith("ppt/media/")]
+    assert media
+    assert all(types[name] == zipfile.ZIP_STORED for name in media)
+    assert types["ppt/presentation.xml"] == zipfile.ZIP_DEFLATED
+
+
+def test_repeated_page_images_share_one_part():
+    prs = pptx.Presentation()
+    image_parts = {}
+    for image_bytes in (png_bytes(), png_bytes('blue'), png_bytes()):
+        slide = prs.slides.add_slide(prs.slide_layouts[6])
+        _add_page_picture(slide, image_bytes, Inches(1), Inches(1), Inches(2), Inches(2), image_parts)
+    
+    output = io.BytesIO()
+    _save_presentation(prs, output)
+    
+    reopened = pptx.Presentation(io.BytesIO(output.getvalue()))
+    pictures = [slide.shapes[0] for slide in reopened.slides]
+    assert [picture.image.sha1 for picture in pictures] == [
+        pictures[0].image.sha1, pictures[1].image.sha1, pictures[0].image.sha1
+    ]
+    assert pictures[0].image.sha1 != pictures[1].image.sha1
+    assert all(picture.width == Inches(2) for picture in pictures)
+    media = [name for name in compress_types(output.getvalue()) if name.startswith("ppt/media/")]
+    assert len(media) == 2
+
+
+def test_plain_save_keeps_python_pptx_behaviour():
+    # Wrap the writer first, then save without _save_presentation()
+    _save_presentation(make_picture_deck(), io.BytesIO())
+    output = io.BytesIO()
+    make_picture_deck().save(output)
+    
+    types = compress_types(output.getvalue())
+    assert all(compress_type == zipfile.ZIP_DEFLATED for compress_type in types.values())